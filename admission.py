@@ -0,0 +1,57 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# Интервал замера задержки цикла событий
+LAG_CHECK_INTERVAL = 0.1
+# Коэффициент сглаживания задержки (экспоненциальное скользящее среднее)
+LAG_SMOOTHING = 0.3
+# Задержка цикла, при которой дорогие операции деградируют
+LAG_THRESHOLD = 0.2
+
+# Сколько дорогих операций каждого вида может выполняться одновременно
+INFLIGHT_LIMITS = {
+    'chart': 4,
+    'food_lookup': 32,
+}
+
+
+class AdmissionController:
+    """Решает, выполнять ли дорогую операцию полностью или в облегчённом виде.
+
+    Учитывает число уже выполняющихся операций того же вида и задержку
+    цикла событий. Дешёвые команды (запись воды и т.п.) через контроллер
+    не проходят и не ограничиваются.
+    """
+
+    def __init__(self, limits: Dict[str, int], lag_threshold: float = LAG_THRESHOLD):
+        self.limits = limits
+        self.lag_threshold = lag_threshold
+        self.inflight: Dict[str, int] = {kind: 0 for kind in limits}
+        self.shed: Dict[str, int] = {kind: 0 for kind in limits}
+        self.loop_lag = 0.0
+
+    def overloaded(self, kind: str) -> bool:
+        """Проверяет, нужно ли облегчить операцию вида kind; учитывает отказ в счётчике shed"""
+        if self.inflight[kind] >= self.limits[kind] or self.loop_lag >= self.lag_threshold:
+            self.shed[kind] += 1
+            return True
+        return False
+
+    @contextmanager
+    def track(self, kind: str):
+        """Учитывает выполняющуюся операцию вида kind"""
+        self.inflight[kind] += 1
+        try:
+            yield
+        finally:
+            self.inflight[kind] -= 1
+
+    async def run_lag_monitor(self):
+        """Фоновый замер задержки цикла событий: насколько позже заказанного просыпается sleep"""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_CHECK_INTERVAL)
+            lag = max(0.0, time.perf_counter() - started - LAG_CHECK_INTERVAL)
+            self.loop_lag += LAG_SMOOTHING * (lag - self.loop_lag)
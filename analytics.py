@@ -0,0 +1,166 @@
+"""Глобальные счётчики для администратора, обновляемые по мере записи данных.
+
+Ничего не перебирает users: каждое событие меняет несколько счётчиков
+за O(1), а сводка читается тоже за O(1). Число различных пользователей
+оценивается HyperLogLog-скетчем фиксированного размера.
+"""
+import math
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+MASK64 = (1 << 64) - 1
+# 2^12 регистров: 4 КБ на скетч, стандартная ошибка оценки ~1.6%
+HLL_PRECISION = 12
+# Сколько самых частых команд показывать в сводке
+TOP_COMMANDS = 8
+
+
+def _mix64(x: int) -> int:
+    """Перемешивание splitmix64: последовательные id дают независимые 64-битные хэши"""
+    z = (x + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+class HyperLogLog:
+    """Оценка числа различных целых id.
+
+    Сумма 2^-регистр и число нулевых регистров поддерживаются при добавлении,
+    поэтому оценка считается за O(1), без прохода по регистрам.
+    """
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self._registers = bytearray(self.m)
+        self._zeros = self.m
+        self._inverse_sum = float(self.m)
+        self._alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, item: int):
+        x = _mix64(item)
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        old = self._registers[index]
+        if rank > old:
+            if old == 0:
+                self._zeros -= 1
+            self._inverse_sum += 2.0 ** -rank - 2.0 ** -old
+            self._registers[index] = rank
+
+    def __len__(self) -> int:
+        estimate = self._alpha * self.m * self.m / self._inverse_sum
+        if estimate <= 2.5 * self.m and self._zeros:
+            # Поправка для малых значений (линейный подсчёт)
+            estimate = self.m * math.log(self.m / self._zeros)
+        return int(estimate + 0.5)
+
+
+class PeriodStats:
+    """Счётчики за период (день или всё время работы)"""
+
+    __slots__ = ('users', 'water', 'calories_consumed', 'calories_burned', 'entries', 'commands', 'shown', 'clicks')
+
+    def __init__(self):
+        self.users = HyperLogLog()
+        self.water = 0
+        self.calories_consumed = 0.0
+        self.calories_burned = 0.0
+        self.entries: Counter = Counter()   # записи по видам: water, food, workout
+        self.commands: Counter = Counter()  # команды по названию
+        self.shown: Counter = Counter()     # показы кнопок рекомендаций по видам: food, workout
+        self.clicks: Counter = Counter()    # нажатия на них
+
+    def describe(self, title: str) -> List[str]:
+        lines = [
+            f"{title}: пользователей ~{len(self.users)}",
+            f"Записей: вода {self.entries['water']} ({self.water / 1000:.1f} л), "
+            f"еда {self.entries['food']} ({self.calories_consumed:.0f} ккал), "
+            f"тренировки {self.entries['workout']} ({self.calories_burned:.0f} ккал)",
+        ]
+        for kind, name in (('food', 'еда'), ('workout', 'тренировки')):
+            shown = self.shown[kind]
+            if shown:
+                lines.append(
+                    f"Рекомендации ({name}): показано {shown}, нажато {self.clicks[kind]} "
+                    f"({self.clicks[kind] / shown:.0%})"
+                )
+        if self.commands:
+            lines.append("Команды: " + ", ".join(
+                f"/{name} {count}" for name, count in self.commands.most_common(TOP_COMMANDS)
+            ))
+        return lines
+
+
+class Analytics:
+    """Сегодняшние, вчерашние и накопленные с запуска счётчики.
+
+    День считается по часовому поясу utc_offset; новый день начинается
+    при первом событии после полуночи.
+    """
+
+    def __init__(self, utc_offset: int = 0):
+        self.utc_offset = utc_offset
+        self.started = time.time()
+        self.day = self._today()
+        self.today = PeriodStats()
+        self.yesterday: Optional[PeriodStats] = None
+        self.total = PeriodStats()
+
+    def _today(self) -> int:
+        return int((time.time() + self.utc_offset) // 86400)
+
+    def _periods(self):
+        day = self._today()
+        if day != self.day:
+            self.yesterday = self.today if day == self.day + 1 else None
+            self.today = PeriodStats()
+            self.day = day
+        return self.today, self.total
+
+    def active(self, user_id: int):
+        """Пользователь что-то отправил или нажал"""
+        for period in self._periods():
+            period.users.add(user_id)
+
+    def command(self, name: str):
+        for period in self._periods():
+            period.commands[name] += 1
+
+    def log_water(self, ml: int):
+        for period in self._periods():
+            period.water += ml
+            period.entries['water'] += 1
+
+    def log_food(self, calories: float):
+        for period in self._periods():
+            period.calories_consumed += calories
+            period.entries['food'] += 1
+
+    def log_workout(self, calories: float):
+        for period in self._periods():
+            period.calories_burned += calories
+            period.entries['workout'] += 1
+
+    def recommendation_shown(self, kind: str):
+        for period in self._periods():
+            period.shown[kind] += 1
+
+    def recommendation_clicked(self, kind: str):
+        for period in self._periods():
+            period.clicks[kind] += 1
+
+    def describe(self) -> str:
+        """Сводка для администратора"""
+        self._periods()
+        lines = ["📊 Статистика бота", ""]
+        lines += self.today.describe("Сегодня")
+        if self.yesterday is not None:
+            lines += [""] + self.yesterday.describe("Вчера")
+        started = datetime.fromtimestamp(self.started).strftime('%d.%m.%Y %H:%M')
+        lines += [""] + self.total.describe(f"С запуска ({started})")
+        return "\n".join(lines)
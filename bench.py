@@ -0,0 +1,351 @@
+"""Микробенчмарки горячих путей бота.
+
+Запуск: python bench.py <имя> (без аргументов — все бенчмарки)
+
+`python bench.py startup` завершается с ошибкой при превышении бюджета
+времени запуска, поэтому его можно использовать как проверку в CI.
+"""
+import os
+import sys
+import timeit
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+
+
+def bench_callbacks(number: int = 200_000):
+    """Стоимость выбора обработчика нажатия: цепочка lambda-фильтров против таблицы префиксов"""
+    from callbacks import QuickFoodCallback
+    from handlers import CALLBACK_ROUTES
+
+    # Так нажатия маршрутизировались раньше: фильтры проверяются по очереди
+    filters = [
+        lambda c: c.startswith("quick_log_food:"),
+        lambda c: c.startswith("quick_log_workout:"),
+        lambda c: c == "show_progress",
+        lambda c: c == "close_recommendations",
+        lambda c: c == "cancel_operation",
+        lambda c: c == "show_help",
+        lambda c: c == "set_profile",
+        lambda c: c == "recommend_now",
+    ]
+
+    def chain(data):
+        for i, f in enumerate(filters):
+            if f(data):
+                return i
+        return None
+
+    def table(data):
+        return CALLBACK_ROUTES.get(data.partition(":")[0])
+
+    cases = {
+        "первый фильтр": ("quick_log_food:йогурт натуральный:200", QuickFoodCallback(food_id=5, grams=200).pack()),
+        "последний фильтр": ("recommend_now", "recommend_now"),
+        "нет совпадения": ("unknown", "unknown"),
+    }
+    for name, (old_data, new_data) in cases.items():
+        old = timeit.timeit(lambda: chain(old_data), number=number) / number * 1e9
+        new = timeit.timeit(lambda: table(new_data), number=number) / number * 1e9
+        print(f"callbacks [{name}]: цепочка {old:.0f} нс, таблица {new:.0f} нс")
+
+    unpack = timeit.timeit(lambda: QuickFoodCallback.unpack("qf:5:200"), number=number // 10) / (number // 10) * 1e9
+    print(f"callbacks: распаковка QuickFoodCallback {unpack:.0f} нс")
+
+
+def bench_memory(n_users: int = 2000, n_days: int = 365):
+    """Память на пользователя (tracemalloc): словарь словарей против User с упакованной историей"""
+    import tracemalloc
+    from datetime import date, datetime, timedelta
+
+    from models import User
+
+    first_day = date(2025, 1, 1)
+
+    def legacy_user():
+        user = {
+            'weight': 75.0, 'height': 180.0, 'age': 30, 'gender': 'м',
+            'activity': 45, 'city': 'Москва', 'water_goal': 2750, 'calorie_goal': 2600,
+            'logged_water': 1500, 'logged_calories': 1830.5, 'burned_calories': 320,
+            'last_update': datetime.now(),
+            'pending_food': None,
+            'history': {}
+        }
+        for i in range(n_days):
+            user['history'][(first_day + timedelta(days=i)).isoformat()] = {
+                'water': 1500 + i, 'calories_consumed': 1830.5 + i, 'calories_burned': 320,
+                'water_goal': 2750, 'calorie_goal': 2600
+            }
+        return user
+
+    def compact_user():
+        user = User(10800, first_day)
+        user.update({
+            'weight': 75.0, 'height': 180.0, 'age': 30, 'gender': 'м',
+            'activity': 45, 'city': 'Москва', 'water_goal': 2750, 'calorie_goal': 2600,
+            'logged_water': 1500, 'logged_calories': 1830.5, 'burned_calories': 320,
+        })
+        for i in range(n_days):
+            user.history.upsert(first_day.toordinal() + i, 1500 + i, 1830.5 + i, 320, 2750, 2600)
+        return user
+
+    for name, factory in (("словарь", legacy_user), ("User", compact_user)):
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        users = {i: factory() for i in range(n_users)}
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+        print(f"memory [{name}]: {total / n_users:.0f} байт на пользователя ({n_days} дней истории)")
+        del users
+
+
+# Модули, которые не должны загружаться при запуске бота (импортируются при первом использовании)
+LAZY_MODULES = ('matplotlib', 'multiprocessing')
+# Модули, загружаемые при запуске: bot.py импортирует handlers (а с ним services) лениво, в create_dispatcher
+STARTUP_MODULES = ('bot', 'services', 'handlers')
+# Бюджет времени импорта модулей запуска и времени до первого обработанного обновления
+STARTUP_BUDGET_MS = int(os.getenv("STARTUP_BUDGET_MS", "5000"))
+FIRST_UPDATE_BUDGET_MS = int(os.getenv("FIRST_UPDATE_BUDGET_MS", "6000"))
+
+
+def _first_update():
+    """Импортирует бота и обрабатывает одно обновление без обращения к Telegram"""
+    import asyncio
+
+    from aiogram import Bot
+    from aiogram.client.session.base import BaseSession
+    from aiogram.types import Update
+
+    from bot import create_dispatcher
+
+    class NullSession(BaseSession):
+        async def make_request(self, bot, method, timeout=None):
+            return None
+
+        async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+            yield b""
+
+        async def close(self):
+            pass
+
+    update = Update.model_validate({
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': 0, 'text': '/help',
+            'chat': {'id': 1, 'type': 'private'},
+            'from': {'id': 1, 'is_bot': False, 'first_name': 'bench'},
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': 5}],
+        },
+    })
+    asyncio.run(create_dispatcher().feed_update(Bot(token="42:bench", session=NullSession()), update))
+
+
+def bench_startup():
+    """Время импорта STARTUP_MODULES (python -X importtime) и время до первого обработанного обновления.
+
+    Завершается с ошибкой, если при запуске загружаются тяжёлые модули
+    из LAZY_MODULES или превышен бюджет времени.
+    """
+    import subprocess
+    import time
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(STARTUP_MODULES)}"],
+        capture_output=True, text=True, check=True
+    )
+    imported = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            imported[name.strip()] = int(cumulative) / 1000
+    # Модули импортируются по очереди, поэтому их накопленные времена не пересекаются
+    total = sum(imported.get(name, 0.0) for name in STARTUP_MODULES)
+    heavy = [name for name in imported if name.split(".")[0] in LAZY_MODULES]
+    slowest = sorted(((ms, name) for name, ms in imported.items() if name not in STARTUP_MODULES), reverse=True)[:5]
+    print(f"startup: импорт {', '.join(STARTUP_MODULES)} {total:.0f} мс (бюджет {STARTUP_BUDGET_MS} мс)")
+    for ms, name in slowest:
+        print(f"  {name}: {ms:.0f} мс")
+
+    started = time.perf_counter()
+    subprocess.run([sys.executable, __file__, "_first_update"], check=True)
+    first_update = (time.perf_counter() - started) * 1000
+    print(f"startup: до первого обработанного обновления {first_update:.0f} мс (бюджет {FIRST_UPDATE_BUDGET_MS} мс)")
+
+    errors = []
+    if heavy:
+        errors.append(f"при запуске загружаются модули, которые должны импортироваться лениво: {', '.join(sorted(heavy))}")
+    if total > STARTUP_BUDGET_MS:
+        errors.append(f"импорт bot.py занимает {total:.0f} мс — больше бюджета {STARTUP_BUDGET_MS} мс")
+    if first_update > FIRST_UPDATE_BUDGET_MS:
+        errors.append(f"первое обновление обработано через {first_update:.0f} мс — больше бюджета {FIRST_UPDATE_BUDGET_MS} мс")
+    if errors:
+        sys.exit("startup: " + "; ".join(errors))
+
+
+def bench_upstream(n_requests: int = 300, slow_share: float = 0.05, slow_delay: float = 1.0):
+    """Задержка внешних запросов (p50/p95/p99) с дублированием и без него.
+
+    Локальный сервер отвечает за ~20 мс, но каждый slow_share-й ответ
+    задерживается на slow_delay — как «хвост» у OpenFoodFacts.
+    """
+    import asyncio
+    import random
+    import time
+
+    from aiohttp import web
+
+    import upstream
+
+    async def handle(request):
+        await asyncio.sleep(slow_delay if random.random() < slow_share else 0.02)
+        return web.json_response({'products': []})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/search', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/search"
+
+        for hedge in (False, True):
+            service = upstream.Upstream('bench', hedge=hedge)
+            latencies = []
+            for _ in range(n_requests):
+                started = time.perf_counter()
+                await service.get_json(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+            latencies.sort()
+            p50, p95, p99 = (latencies[int(len(latencies) * q) - 1] for q in (0.5, 0.95, 0.99))
+            name = "с дублированием" if hedge else "без дублирования"
+            print(f"upstream [{name}]: p50 {p50:.0f} мс, p95 {p95:.0f} мс, p99 {p99:.0f} мс, "
+                  f"дублей {service.stats['hedged']}")
+
+        await upstream.get_session().close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+
+
+def _sample_chart_data(seed: int):
+    import random
+
+    rng = random.Random(seed)
+    dates = [f"01-{day:02d}" for day in range(1, 8)]
+    water = [float(rng.randrange(500, 3500, 50)) for _ in dates]
+    consumed = [float(rng.randrange(1200, 3200, 10)) for _ in dates]
+    burned = [float(rng.randrange(0, 600, 10)) for _ in dates]
+    return dates, water, [2750] * 7, consumed, burned, [2600] * 7
+
+
+def _legacy_progress_chart(data) -> bytes:
+    """Прежняя отрисовка: новая фигура, оформление и легенды на каждый график"""
+    from io import BytesIO
+
+    from charts import get_pyplot
+
+    dates, water_vals, water_goals, cal_cons, cal_burn, cal_goals = data
+    plt = get_pyplot()
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
+    fig.suptitle('Прогресс за последние 7 дней', fontsize=16, fontweight='bold', color='#2C3E50')
+    x = range(len(dates))
+    ax1.bar(x, water_vals, color='#3498DB', alpha=0.85, label='Выпито', edgecolor='white', linewidth=1.5)
+    ax1.plot(x, water_goals, '--', marker='o', linewidth=2.5, label='Норма', markersize=8, color='#E74C3C')
+    for i, (val, goal) in enumerate(zip(water_vals, water_goals)):
+        ax1.text(i, val + max(water_goals) * 0.03, f'{int(val)} мл',
+                 ha='center', va='bottom', fontsize=9, fontweight='bold', color='#2C3E50')
+        if val >= goal:
+            ax1.text(i, goal * 0.3, '✓', ha='center', va='center', fontsize=16, color='green', fontweight='bold')
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(dates, rotation=45, ha='right', fontsize=10)
+    ax1.set_ylabel('Вода (мл)', fontsize=12, fontweight='bold', color='#2C3E50')
+    ax1.set_title('Потребление воды', fontsize=14, pad=12, color='#2C3E50')
+    ax1.legend(loc='upper left', frameon=True, shadow=True)
+    ax1.grid(axis='y', alpha=0.3, linestyle='--')
+    ax1.set_ylim(0, max(max(water_goals) * 1.25, max(water_vals) * 1.25))
+    ax1.set_facecolor('#F8F9FA')
+    width = 0.35
+    ax2.bar([i - width/2 for i in x], cal_cons, width,
+            color='#E67E22', alpha=0.85, label='Потреблено', edgecolor='white', linewidth=1.5)
+    ax2.bar([i + width/2 for i in x], cal_burn, width,
+            color='#1ABC9C', alpha=0.85, label='Сожжено', edgecolor='white', linewidth=1.5)
+    ax2.plot(x, cal_goals, '--', marker='o', linewidth=2.5, label='Норма', markersize=8, color='#E74C3C')
+    for i, (cons, burn, goal) in enumerate(zip(cal_cons, cal_burn, cal_goals)):
+        net = cons - burn
+        ax2.text(i, max(cons, burn) + max(cal_goals) * 0.05, f'{int(net)}', ha='center', va='bottom',
+                 fontsize=10, fontweight='bold', color='green' if net <= goal else '#E67E22')
+    ax2.set_xticks(x)
+    ax2.set_xticklabels(dates, rotation=45, ha='right', fontsize=10)
+    ax2.set_ylabel('Калории (ккал)', fontsize=12, fontweight='bold', color='#2C3E50')
+    ax2.set_title('Баланс калорий (потреблено - сожжено)', fontsize=14, pad=12, color='#2C3E50')
+    ax2.legend(loc='upper left', frameon=True, shadow=True)
+    ax2.grid(axis='y', alpha=0.3, linestyle='--')
+    ax2.set_ylim(0, max(max(cal_goals) * 1.35, max(cal_cons + cal_burn) * 1.35))
+    ax2.set_facecolor('#F8F9FA')
+    fig.patch.set_facecolor('white')
+    plt.tight_layout()
+    buf = BytesIO()
+    plt.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor='white')
+    plt.close(fig)
+    return buf.getvalue()
+
+
+# Скорости исходящего канала бота для оценки времени загрузки графика (Мбит/с)
+UPLINK_MBITS = (1, 10)
+
+
+def bench_charts(n_charts: int = 30):
+    """Время построения и размер графика /show_stats: новая полноцветная фигура на каждый вызов
+    против шаблона с кодированием в пределах бюджета байт.
+
+    Время загрузки в Telegram оценивается по размеру для скоростей из UPLINK_MBITS.
+    """
+    import time
+
+    from charts import DEFAULT_BYTE_BUDGET, get_chart_template, render_progress_chart
+
+    samples = [_sample_chart_data(seed) for seed in range(n_charts)]
+    # Первый вызов каждого способа — импорт matplotlib и загрузка шрифтов, он не учитывается
+    _legacy_progress_chart(samples[0])
+    started = time.perf_counter()
+    get_chart_template(7)
+    print(f"charts: построение шаблона {(time.perf_counter() - started) * 1000:.0f} мс (один раз на поток)")
+
+    renderers = (
+        ("новая фигура, PNG", _legacy_progress_chart),
+        (f"шаблон, бюджет {DEFAULT_BYTE_BUDGET // 1024} КБ", lambda data: render_progress_chart(data).data),
+    )
+    for name, render in renderers:
+        started = time.perf_counter()
+        sizes = [len(render(data)) for data in samples]
+        elapsed = (time.perf_counter() - started) / n_charts * 1000
+        size = sum(sizes) / len(sizes)
+        uploads = ", ".join(f"{size * 8 / (mbits * 1e6) * 1000:.0f} мс при {mbits} Мбит/с" for mbits in UPLINK_MBITS)
+        print(f"charts [{name}]: {elapsed:.0f} мс на график, {size / 1024:.0f} КБ (загрузка: {uploads})")
+
+    encodings = {}
+    for data in samples:
+        chart = render_progress_chart(data)
+        key = f"{chart.extension} {chart.dpi} dpi"
+        encodings[key] = encodings.get(key, 0) + 1
+    print("charts: выбранные варианты кодирования — " + ", ".join(f"{k}: {v}" for k, v in encodings.items()))
+
+
+BENCHMARKS = {
+    "callbacks": bench_callbacks,
+    "charts": bench_charts,
+    "memory": bench_memory,
+    "startup": bench_startup,
+    "upstream": bench_upstream,
+    "_first_update": _first_update,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or [name for name in BENCHMARKS if not name.startswith("_")]
+    for name in names:
+        BENCHMARKS[name]()
@@ -1,22 +1,53 @@
 import asyncio
+import importlib
+from types import ModuleType
+from typing import Optional
 from aiogram import Bot, Dispatcher
-from config import TOKEN
-from handlers import setup_handlers
-from middlewares import LoggingMiddleware
+from config import TOKEN, SHARD_WORKERS, TENANTS_PATH
+from upstream import close_session
+from middlewares import LoggingMiddleware, AnalyticsMiddleware, ProfilingMiddleware, DeadlineMiddleware, ExecutionMiddleware
 
-# Создаем экземпляры бота и диспетчера
-bot = Bot(token=TOKEN)
-dp = Dispatcher()
-
-# Настраиваем middleware и обработчики
-dp.message.middleware(LoggingMiddleware())
-setup_handlers(dp)
 
+def create_dispatcher(handlers: Optional[ModuleType] = None) -> Dispatcher:
+    """Создает диспетчер и настраивает middleware и обработчики (handlers — модуль обработчиков бота)"""
+    handlers = handlers or importlib.import_module('handlers')
+    dp = Dispatcher()
+    dp.update.outer_middleware(ProfilingMiddleware(handlers.profiler))
+    dp.update.outer_middleware(DeadlineMiddleware())
+    dp.message.middleware(LoggingMiddleware())
+    # Сводная статистика и ограничение одновременных обработчиков и их сроков — одни на все виды обновлений
+    analytics_middleware = AnalyticsMiddleware(handlers.analytics)
+    execution_middleware = ExecutionMiddleware(handlers.execution)
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(analytics_middleware)
+        observer.middleware(execution_middleware)
+    handlers.setup_handlers(dp)
+    return dp
 
 
 async def main():
     print("Бот запущен!")
-    await dp.start_polling(bot)
+    if TENANTS_PATH:
+        # Несколько ботов в одном процессе с общими кэшами
+        from tenants import load_tenants, run_tenants
+        await run_tenants(load_tenants(TENANTS_PATH))
+        return
+
+    if SHARD_WORKERS > 1:
+        # Обновления распределяются по процессам по user_id
+        from sharding import run_sharded
+        await run_sharded(TOKEN, SHARD_WORKERS)
+        return
+
+    import handlers
+    bot = Bot(token=TOKEN)
+    dp = create_dispatcher(handlers)
+    # Фоновое закрытие дня, напоминания и их отправка
+    handlers.start_background_tasks(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await close_session()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+from aiogram.filters.callback_data import CallbackData
+
+
+class QuickFoodCallback(CallbackData, prefix="qf"):
+    food_id: int  # id продукта из catalog.low_cal_foods
+    grams: int
+
+
+class QuickWorkoutCallback(CallbackData, prefix="qw"):
+    workout_id: int  # id тренировки из catalog.burn_workouts
+    minutes: int
+
+
+class WaterPresetCallback(CallbackData, prefix="wp"):
+    ml: int
+
+
+class WorkoutPresetCallback(CallbackData, prefix="wk"):
+    workout: str  # Ключ catalog.workout_calories
+    minutes: int
+
+
+class FoodPickCallback(CallbackData, prefix="fp"):
+    page: int
+    index: int  # Номер кандидата на странице поиска
+
+
+class FoodPageCallback(CallbackData, prefix="fpg"):
+    page: int
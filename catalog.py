@@ -0,0 +1,123 @@
+"""Справочники продуктов и тренировок, загружаемые из версионированного файла.
+
+Каталог — неизменяемый снимок со всеми производными структурами. Новый снимок
+строится в отдельном потоке и подменяет текущий одним присваиванием, поэтому
+обработка обновлений не приостанавливается, а каждый обработчик, взявший
+catalogs.current один раз, видит согласованные данные.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from inline_search import PrefixIndex
+
+# Как часто проверяется, не изменился ли файл каталога
+CATALOG_POLL_INTERVAL = 5.0
+# Названия типов тренировок передаются в данных кнопок, которые ограничены 64 байтами
+# и разделяются двоеточием
+MAX_NAME_BYTES = 40
+
+
+def _check_number(value: Any, what: str, positive: bool = True):
+    """Числовые поля участвуют в делении (порции, калории в минуту), поэтому не могут быть нулевыми"""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0 or (positive and value == 0):
+        raise ValueError(f"{what}: ожидается {'положительное' if positive else 'неотрицательное'} число, получено {value!r}")
+
+
+class Catalog:
+    """Снимок справочников версии version и производные структуры для горячих путей"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.version = int(data['version'])
+        for name, calories in data['food_fallback'].items():
+            _check_number(calories, f"калорийность «{name}»", positive=False)
+        for name, rate in data['workout_calories'].items():
+            _check_number(rate, f"расход калорий «{name}»")
+        self.food_fallback: Dict[str, float] = {
+            name.lower(): calories for name, calories in data['food_fallback'].items()
+        }
+        self.workout_calories: Dict[str, float] = {
+            name.lower(): rate for name, rate in data['workout_calories'].items()
+        }
+        low_cal_foods = [dict(food) for food in data['low_cal_foods']]
+        burn_workouts = [dict(workout) for workout in data['burn_workouts']]
+        for food in low_cal_foods:
+            _check_number(food['calories'], f"калорийность «{food['name']}»")
+            _check_number(food['portion'], f"порция «{food['name']}»")
+        for workout in burn_workouts:
+            _check_number(workout['cal_per_min'], f"расход калорий «{workout['name']}»")
+        for item in [*low_cal_foods, *burn_workouts, *({'name': n} for n in self.workout_calories)]:
+            if not isinstance(item['name'], str):
+                raise ValueError(f"название должно быть строкой: {item['name']!r}")
+            if len(item['name'].encode()) > MAX_NAME_BYTES or ':' in item['name']:
+                raise ValueError(f"слишком длинное название или двоеточие в названии: {item['name']}")
+        # Кнопки рекомендаций ссылаются на продукты и тренировки по id, который не меняется между версиями
+        for items in (low_cal_foods, burn_workouts):
+            ids = [item['id'] for item in items]
+            if any(not isinstance(i, int) or i < 0 for i in ids) or len(set(ids)) != len(ids):
+                raise ValueError(f"id должны быть различными неотрицательными целыми: {ids}")
+
+        # Рекомендации перебирают продукты от самых калорийных порций, тренировки — от самых интенсивных
+        for food in low_cal_foods:
+            food['portion_calories'] = food['calories'] * food['portion'] / 100
+        self.low_cal_foods: Tuple[Dict[str, Any], ...] = tuple(
+            sorted(low_cal_foods, key=lambda f: f['portion_calories'], reverse=True)
+        )
+        self.burn_workouts: Tuple[Dict[str, Any], ...] = tuple(
+            sorted(burn_workouts, key=lambda w: w['cal_per_min'], reverse=True)
+        )
+        self.low_cal_foods_by_id = {food['id']: food for food in self.low_cal_foods}
+        self.burn_workouts_by_id = {workout['id']: workout for workout in self.burn_workouts}
+        self.workout_types = ', '.join(self.workout_calories)
+
+        self.food_prefix_index = PrefixIndex()
+        for name in self.food_fallback:
+            self.food_prefix_index.add(name)
+
+
+def load_catalog(path: str) -> Catalog:
+    """Читает файл каталога и строит снимок (вызывать вне цикла событий)"""
+    with open(path, encoding='utf-8') as f:
+        return Catalog(json.load(f))
+
+
+class CatalogStore:
+    """Текущий каталог и его горячая перезагрузка из файла"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.current = load_catalog(path)
+        self._mtime = os.path.getmtime(path)
+
+    async def reload(self, allow_downgrade: bool = False) -> Optional[Catalog]:
+        """Перечитывает файл и подменяет каталог, если версия в файле больше текущей.
+
+        allow_downgrade разрешает любую другую версию (откат по команде администратора).
+        Возвращает новый каталог или None, если подмены не было. Ошибки чтения
+        и проверки пробрасываются, текущий каталог при этом не меняется.
+        """
+        self._mtime = os.path.getmtime(self.path)
+        loop = asyncio.get_running_loop()
+        catalog = await loop.run_in_executor(None, load_catalog, self.path)
+        if catalog.version == self.current.version:
+            return None
+        if catalog.version < self.current.version and not allow_downgrade:
+            print(f"Каталог {self.path}: версия {catalog.version} не новее текущей {self.current.version}, пропущен")
+            return None
+        self.current = catalog
+        return catalog
+
+    async def watch(self, interval: float = CATALOG_POLL_INTERVAL):
+        """Фоновая проверка файла каталога: при изменении загружает новую версию"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if os.path.getmtime(self.path) == self._mtime:
+                    continue
+                catalog = await self.reload()
+                if catalog:
+                    print(f"📚 Загружен каталог версии {catalog.version}")
+            except Exception as e:
+                # Любая ошибка в файле оставляет прежний каталог и не останавливает слежение
+                print(f"Ошибка загрузки каталога {self.path}: {e!r}")
@@ -0,0 +1,255 @@
+"""Построение графиков прогресса и кэш готовых изображений.
+
+Модуль не зависит от aiogram, поэтому его функции можно выполнять
+в отдельных процессах при пакетной отрисовке.
+"""
+import os
+from functools import partial
+from io import BytesIO
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Данные графика: даты, вода, нормы воды, потреблено, сожжено, нормы калорий
+ChartData = Tuple[list, list, list, list, list, list]
+
+# Размер изображения графика по умолчанию (байт)
+DEFAULT_BYTE_BUDGET = 64 * 1024
+# Варианты кодирования (dpi, формат) от лучшего качества к меньшему размеру;
+# при dpi 100 (1000x800) самые мелкие подписи ещё читаются
+CHART_ENCODINGS = ((150, 'png'), (120, 'png'), (100, 'png'), (100, 'jpeg'))
+PALETTE_COLORS = 64
+JPEG_QUALITY = 70
+
+
+class EncodedChart(NamedTuple):
+    data: bytes
+    extension: str
+    dpi: int
+
+
+def encode_figure(fig, byte_budget: int = DEFAULT_BYTE_BUDGET) -> EncodedChart:
+    """Кодирует фигуру в первый вариант из CHART_ENCODINGS, который укладывается в byte_budget.
+
+    PNG сохраняется с палитрой из PALETTE_COLORS цветов: на графике с заливками
+    одним цветом это втрое меньше полноцветного PNG без заметной потери качества.
+    Если ни один вариант не уложился в бюджет, возвращается самый маленький.
+    """
+    from PIL import Image
+
+    smallest = None
+    image, image_dpi = None, None
+    for dpi, image_format in CHART_ENCODINGS:
+        if dpi != image_dpi:
+            fig.set_dpi(dpi)
+            fig.canvas.draw()
+            width, height = fig.canvas.get_width_height(physical=True)
+            image = Image.frombuffer('RGBA', (width, height), fig.canvas.buffer_rgba(), 'raw', 'RGBA', 0, 1).convert('RGB')
+            image_dpi = dpi
+        buf = BytesIO()
+        if image_format == 'png':
+            image.quantize(PALETTE_COLORS, method=Image.Quantize.FASTOCTREE).save(buf, 'PNG')
+            encoded = EncodedChart(buf.getvalue(), 'png', dpi)
+        else:
+            image.save(buf, 'JPEG', quality=JPEG_QUALITY, optimize=True)
+            encoded = EncodedChart(buf.getvalue(), 'jpg', dpi)
+        if len(encoded.data) <= byte_budget:
+            return encoded
+        if smallest is None or len(encoded.data) < len(smallest.data):
+            smallest = encoded
+    return smallest
+
+
+def get_pyplot():
+    """Импортирует matplotlib при первом построении графика, а не при запуске бота"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+class ProgressChartTemplate:
+    """Фигура графиков прогресса за n дней, построенная один раз.
+
+    Оформление, легенды и все столбцы и подписи создаются в конструкторе,
+    а render только меняет высоты столбцов, линии норм, подписи и пределы осей.
+    Шаблон не потокобезопасен: каждый поток или процесс использует свои шаблоны.
+    """
+
+    def __init__(self, n: int):
+        plt = get_pyplot()
+        self.n = n
+        x = list(range(n))
+        zeros = [0] * n
+        fig = self.fig = plt.figure(figsize=(10, 8))
+        ax1, ax2 = self.ax1, self.ax2 = fig.subplots(2, 1)
+        fig.suptitle('Прогресс за последние 7 дней', fontsize=16, fontweight='bold', color='#2C3E50')
+
+        self.water_bars = ax1.bar(x, zeros, color='#3498DB', alpha=0.85, label='Выпито', edgecolor='white', linewidth=1.5)
+        self.water_goal_line, = ax1.plot(x, zeros, '--', marker='o', linewidth=2.5, label='Норма', markersize=8, color='#E74C3C')
+        self.water_labels = [
+            ax1.text(i, 0, '', ha='center', va='bottom', fontsize=9, fontweight='bold', color='#2C3E50')
+            for i in x
+        ]
+        self.water_checks = [
+            ax1.text(i, 0, '✓', ha='center', va='center', fontsize=16, color='green', fontweight='bold', visible=False)
+            for i in x
+        ]
+        ax1.set_xticks(x)
+        ax1.set_ylabel('Вода (мл)', fontsize=12, fontweight='bold', color='#2C3E50')
+        ax1.set_title('Потребление воды', fontsize=14, pad=12, color='#2C3E50')
+        ax1.legend(loc='upper left', frameon=True, shadow=True)
+        ax1.grid(axis='y', alpha=0.3, linestyle='--')
+        ax1.set_facecolor('#F8F9FA')
+
+        width = 0.35
+        self.consumed_bars = ax2.bar([i - width/2 for i in x], zeros, width,
+                                     color='#E67E22', alpha=0.85, label='Потреблено', edgecolor='white', linewidth=1.5)
+        self.burned_bars = ax2.bar([i + width/2 for i in x], zeros, width,
+                                   color='#1ABC9C', alpha=0.85, label='Сожжено', edgecolor='white', linewidth=1.5)
+        self.calorie_goal_line, = ax2.plot(x, zeros, '--', marker='o', linewidth=2.5, label='Норма', markersize=8, color='#E74C3C')
+        self.net_labels = [ax2.text(i, 0, '', ha='center', va='bottom', fontsize=10, fontweight='bold') for i in x]
+        ax2.set_xticks(x)
+        ax2.set_ylabel('Калории (ккал)', fontsize=12, fontweight='bold', color='#2C3E50')
+        ax2.set_title('Баланс калорий (потреблено - сожжено)', fontsize=14, pad=12, color='#2C3E50')
+        ax2.legend(loc='upper left', frameon=True, shadow=True)
+        ax2.grid(axis='y', alpha=0.3, linestyle='--')
+        ax2.set_facecolor('#F8F9FA')
+
+        fig.patch.set_facecolor('white')
+        # Раскладка считается один раз по самым широким подписям осей
+        self._set_dates(['00-00'] * n)
+        ax1.set_ylim(0, 10000)
+        ax2.set_ylim(0, 10000)
+        fig.tight_layout()
+
+    def _set_dates(self, dates: list):
+        for ax in (self.ax1, self.ax2):
+            ax.set_xticklabels(dates, rotation=45, ha='right', fontsize=10)
+
+    def render(self, data: ChartData, byte_budget: int = DEFAULT_BYTE_BUDGET) -> EncodedChart:
+        """Обновляет элементы фигуры по данным и кодирует её в пределах byte_budget"""
+        dates, water_vals, water_goals, cal_cons, cal_burn, cal_goals = data
+
+        water_top = max(water_goals)
+        for i, (val, goal) in enumerate(zip(water_vals, water_goals)):
+            self.water_bars[i].set_height(val)
+            self.water_labels[i].set_y(val + water_top * 0.03)
+            self.water_labels[i].set_text(f'{int(val)} мл')
+            self.water_checks[i].set_y(goal * 0.3)
+            self.water_checks[i].set_visible(val >= goal)
+        self.water_goal_line.set_ydata(water_goals)
+        self.ax1.set_ylim(0, max(water_top * 1.25, max(water_vals) * 1.25))
+
+        calorie_top = max(cal_goals)
+        for i, (cons, burn, goal) in enumerate(zip(cal_cons, cal_burn, cal_goals)):
+            net = cons - burn
+            self.consumed_bars[i].set_height(cons)
+            self.burned_bars[i].set_height(burn)
+            self.net_labels[i].set_y(max(cons, burn) + calorie_top * 0.05)
+            self.net_labels[i].set_text(f'{int(net)}')
+            self.net_labels[i].set_color('green' if net <= goal else '#E67E22')
+        self.calorie_goal_line.set_ydata(cal_goals)
+        self.ax2.set_ylim(0, max(calorie_top * 1.35, max(cal_cons + cal_burn) * 1.35))
+
+        self._set_dates(dates)
+        return encode_figure(self.fig, byte_budget)
+
+
+# Шаблоны текущего процесса по числу дней на графике
+_templates: Dict[int, ProgressChartTemplate] = {}
+
+
+def get_chart_template(n: int) -> ProgressChartTemplate:
+    template = _templates.get(n)
+    if template is None:
+        template = _templates[n] = ProgressChartTemplate(n)
+    return template
+
+
+def render_progress_chart(data: ChartData, byte_budget: int = DEFAULT_BYTE_BUDGET) -> EncodedChart:
+    """Рисует графики прогресса по данным за последние дни"""
+    return get_chart_template(len(data[0])).render(data, byte_budget)
+
+
+def _init_prerender_worker():
+    # Шаблон на 7 дней строится один раз на процесс и переиспользуется для всех пользователей
+    get_chart_template(7)
+
+
+def _prerender_one(job: Tuple[int, ChartData, str], byte_budget: int) -> Tuple[int, str]:
+    user_id, data, base_path = job
+    chart = render_progress_chart(data, byte_budget)
+    path = f"{base_path}.{chart.extension}"
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(chart.data)
+    os.replace(tmp_path, path)
+    return user_id, path
+
+
+def prerender_charts(jobs: List[Tuple[int, ChartData, str]], processes: int = 0,
+                     byte_budget: int = DEFAULT_BYTE_BUDGET) -> List[Tuple[int, str]]:
+    """Отрисовывает графики в пуле процессов и сохраняет их в файлы.
+
+    jobs — (user_id, данные, путь без расширения); возвращает пары (user_id, путь к файлу).
+    """
+    import multiprocessing
+
+    if not jobs:
+        return []
+    ctx = multiprocessing.get_context('spawn')
+    with ctx.Pool(processes or os.cpu_count() or 1, initializer=_init_prerender_worker) as pool:
+        return list(pool.imap_unordered(partial(_prerender_one, byte_budget=byte_budget), jobs, chunksize=16))
+
+
+class CachedChart(NamedTuple):
+    data: ChartData
+    file_id: Optional[str]  # file_id фото, уже загруженного в Telegram
+    path: Optional[str]  # файл, сохранённый пакетной отрисовкой
+
+
+class ChartCache:
+    """Готовые графики: file_id в Telegram и/или файл на диске.
+
+    Запись действительна, пока данные за 7 дней не изменились, поэтому
+    новая запись воды или еды за эти дни сама делает кэш устаревшим.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._entries: Dict[int, CachedChart] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stats = {'uploads': 0, 'upload_bytes': 0, 'upload_seconds': 0.0, 'resends': 0, 'resend_seconds': 0.0}
+
+    def base_path(self, user_id: int) -> str:
+        """Путь к файлу графика без расширения (оно зависит от выбранного формата)"""
+        return os.path.join(self.directory, str(user_id))
+
+    def get(self, user_id: int, data: ChartData) -> Optional[CachedChart]:
+        """Возвращает готовый график, если он построен по тем же данным"""
+        entry = self._entries.get(user_id)
+        if entry is None or entry.data != data:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store_file(self, user_id: int, data: ChartData, path: str):
+        """Запоминает график, сохранённый на диск пакетной отрисовкой"""
+        self._entries[user_id] = CachedChart(data, None, path)
+
+    def store_file_id(self, user_id: int, data: ChartData, file_id: str):
+        """Запоминает file_id отправленного графика — повторно его можно отправить без загрузки"""
+        entry = self._entries.get(user_id)
+        path = entry.path if entry is not None and entry.data == data else None
+        self._entries[user_id] = CachedChart(data, file_id, path)
+
+    def record_send(self, size: int, seconds: float):
+        """Учитывает отправку графика: size байт загружено в Telegram (0 — отправка по file_id)"""
+        if size:
+            self.stats['uploads'] += 1
+            self.stats['upload_bytes'] += size
+            self.stats['upload_seconds'] += seconds
+        else:
+            self.stats['resends'] += 1
+            self.stats['resend_seconds'] += seconds
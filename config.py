@@ -7,5 +7,25 @@ load_dotenv()
 # Чтение токена из переменной окружения
 TOKEN = os.getenv("BOT_TOKEN")
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
-if not TOKEN:
+# Локальный индекс продуктов OpenFoodFacts (строится скриптом food_index.py)
+FOOD_INDEX_PATH = os.getenv("FOOD_INDEX_PATH", "products.db")
+# Число процессов-обработчиков; при 1 бот работает в одном процессе
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "1"))
+# Telegram id администраторов через запятую и папка для файлов профилирования
+ADMIN_IDS = {int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()}
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Справочники продуктов и тренировок (перечитываются при изменении файла);
+# относительный путь считается от папки бота, а не от текущего каталога
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.getenv("CATALOG_PATH", "data/catalog.json"))
+# Ночная отрисовка графиков: папка с PNG, час запуска и число процессов (0 — по числу ядер)
+CHART_CACHE_DIR = os.getenv("CHART_CACHE_DIR", "chart_cache")
+CHART_PRERENDER_HOUR = int(os.getenv("CHART_PRERENDER_HOUR", "4"))
+CHART_PRERENDER_PROCESSES = int(os.getenv("CHART_PRERENDER_PROCESSES", "0"))
+# Желаемый размер изображения графика в байтах: при превышении снижаются dpi и качество
+CHART_BYTE_BUDGET = int(os.getenv("CHART_BYTE_BUDGET", str(64 * 1024)))
+# Час, в который нормы воды пересчитываются по текущей погоде в городах пользователей
+WATER_GOAL_REFRESH_HOUR = int(os.getenv("WATER_GOAL_REFRESH_HOUR", "5"))
+# JSON-файл со списком ботов, которые обслуживает один процесс (см. tenants.py); вместо BOT_TOKEN
+TENANTS_PATH = os.getenv("TENANTS_PATH")
+if not TOKEN and not TENANTS_PATH:
     raise ValueError("Переменная окружения BOT_TOKEN не установлена!")
\ No newline at end of file
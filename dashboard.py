@@ -0,0 +1,91 @@
+import asyncio
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.types import InlineKeyboardMarkup
+
+# Записи, сделанные в течение этого времени после первой, попадают в одно обновление сообщения
+DASHBOARD_DEBOUNCE = 1.5
+
+
+class DashboardMessage(NamedTuple):
+    chat_id: int
+    message_id: int
+    day: int  # номер дня (date.toordinal), к которому относится сообщение
+
+
+class LiveDashboard:
+    """Одно закреплённое сообщение с прогрессом за день на пользователя, которое редактируется на месте.
+
+    Первая запись запускает окно debounce; все записи за это окно объединяются,
+    и сообщение (вместе с рекомендациями) перестраивается один раз по итоговому состоянию.
+    С наступлением нового дня отправляется и закрепляется новое сообщение.
+    """
+
+    def __init__(self, render: Callable[[int], Tuple[str, Optional[InlineKeyboardMarkup]]],
+                 debounce: float = DASHBOARD_DEBOUNCE):
+        self._render = render
+        self.debounce = debounce
+        self._messages: Dict[int, DashboardMessage] = {}
+        self._pending: Dict[int, asyncio.Task] = {}
+        self.stats = {'requests': 0, 'edits': 0, 'sends': 0}
+
+    def request_update(self, bot: Bot, user_id: int, chat_id: int, day: int):
+        """Планирует обновление сообщения пользователя; повторные вызовы в окне debounce объединяются"""
+        self.stats['requests'] += 1
+        if user_id not in self._pending:
+            self._pending[user_id] = asyncio.create_task(self._flush_later(bot, user_id, chat_id, day))
+
+    def forget(self, user_id: int):
+        """Забывает сообщение пользователя (при отключении режима)"""
+        self._messages.pop(user_id, None)
+        task = self._pending.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+
+    def _release(self, user_id: int):
+        # forget() мог уже снять эту задачу, а новая запись — запланировать следующую
+        if self._pending.get(user_id) is asyncio.current_task():
+            del self._pending[user_id]
+
+    async def _flush_later(self, bot: Bot, user_id: int, chat_id: int, day: int):
+        try:
+            await asyncio.sleep(self.debounce)
+            # Записи, сделанные во время отправки, планируют следующее обновление
+            self._release(user_id)
+            text, markup = self._render(user_id)
+            await self._publish(bot, user_id, chat_id, day, text, markup)
+        except TelegramForbiddenError:
+            self._messages.pop(user_id, None)
+        except TelegramBadRequest as e:
+            print(f"Не удалось обновить сообщение с прогрессом {chat_id}: {e}")
+        except Exception as e:
+            print(f"Ошибка обновления сообщения с прогрессом {chat_id}: {e!r}")
+        finally:
+            # При любой ошибке пользователь не должен остаться в ожидании навсегда
+            self._release(user_id)
+
+    async def _publish(self, bot: Bot, user_id: int, chat_id: int, day: int,
+                       text: str, markup: Optional[InlineKeyboardMarkup]):
+        current = self._messages.get(user_id)
+        if current is not None and current.chat_id == chat_id and current.day == day:
+            try:
+                await bot.edit_message_text(
+                    text, chat_id=chat_id, message_id=current.message_id,
+                    parse_mode="HTML", reply_markup=markup
+                )
+                self.stats['edits'] += 1
+                return
+            except TelegramBadRequest as e:
+                if 'message is not modified' in str(e):
+                    return
+                # Сообщение удалено или слишком старое для редактирования — отправляем новое
+
+        message = await bot.send_message(chat_id, text, parse_mode="HTML", reply_markup=markup)
+        self.stats['sends'] += 1
+        self._messages[user_id] = DashboardMessage(chat_id, message.message_id, day)
+        try:
+            await bot.pin_chat_message(chat_id, message.message_id, disable_notification=True)
+        except TelegramBadRequest:
+            pass
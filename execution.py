@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Union
+
+
+class HandlerClass(NamedTuple):
+    concurrency: int  # сколько обработчиков класса выполняется одновременно
+    timeout: float    # срок на ожидание в очереди и выполнение, секунды
+
+
+# Классы обработчиков: сетевые (ждут OpenFoodFacts/OpenWeather), вычислительные
+# (графики, выгрузка истории) и дешёвые (всё остальное)
+EXECUTION_CLASSES = {
+    'network': HandlerClass(concurrency=64, timeout=15.0),
+    'cpu': HandlerClass(concurrency=4, timeout=30.0),
+    'cheap': HandlerClass(concurrency=256, timeout=5.0),
+}
+DEFAULT_CLASS = 'cheap'
+
+
+class ExecutionPolicy:
+    """Ограничивает одновременное выполнение обработчиков по классам и их время.
+
+    aiogram запускает каждое обновление отдельной задачей без ограничений;
+    здесь лишние задачи ждут своей очереди на семафоре класса, не открывая
+    соединений и не занимая процессор. Срок отсчитывается с момента постановки
+    в очередь; по его истечении обработчик отменяется.
+    """
+
+    def __init__(self, classes: Dict[str, HandlerClass],
+                 assignments: Dict[Callable, Union[str, Callable[[Any], Optional[str]]]],
+                 default: str = DEFAULT_CLASS):
+        self.classes = classes
+        self.assignments = assignments
+        self.default = default
+        self._semaphores = {name: asyncio.Semaphore(c.concurrency) for name, c in classes.items()}
+        self.stats = {
+            name: {'handled': 0, 'timeouts': 0, 'waiting': 0, 'queue_seconds': 0.0, 'max_queue_seconds': 0.0}
+            for name in classes
+        }
+
+    def class_of(self, callback: Callable, event: Any = None) -> str:
+        """Класс обработчика; вместо имени класса можно назначить функцию от события (для общих обработчиков)"""
+        name = self.assignments.get(callback, self.default)
+        if callable(name):
+            name = name(event)
+        return name if name in self.classes else self.default
+
+    async def _run(self, name: str, queued_at: float, handler: Callable[[], Awaitable[Any]]) -> Any:
+        stats = self.stats[name]
+        stats['waiting'] += 1
+        try:
+            await self._semaphores[name].acquire()
+        finally:
+            stats['waiting'] -= 1
+        try:
+            waited = time.monotonic() - queued_at
+            stats['handled'] += 1
+            stats['queue_seconds'] += waited
+            stats['max_queue_seconds'] = max(stats['max_queue_seconds'], waited)
+            return await handler()
+        finally:
+            self._semaphores[name].release()
+
+    async def run(self, callback: Callable, handler: Callable[[], Awaitable[Any]], event: Any = None) -> Any:
+        """Выполняет обработчик по правилам его класса; при истечении срока бросает asyncio.TimeoutError"""
+        name = self.class_of(callback, event)
+        try:
+            return await asyncio.wait_for(self._run(name, time.monotonic(), handler), self.classes[name].timeout)
+        except asyncio.TimeoutError:
+            self.stats[name]['timeouts'] += 1
+            raise
+
+    def describe(self) -> str:
+        """Сводка по очередям классов для администратора"""
+        lines = []
+        for name, stats in self.stats.items():
+            handled = stats['handled'] or 1
+            lines.append(
+                f"{name}: выполнено {stats['handled']}, ждут {stats['waiting']}, "
+                f"ожидание в среднем {stats['queue_seconds'] / handled * 1000:.0f} мс "
+                f"(макс. {stats['max_queue_seconds'] * 1000:.0f} мс), по сроку отменено {stats['timeouts']}"
+            )
+        return "\n".join(lines)
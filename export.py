@@ -0,0 +1,94 @@
+import asyncio
+import csv
+import io
+import json
+import zlib
+from datetime import date
+from typing import Any, AsyncGenerator, Dict, Iterable, Iterator
+
+from aiogram import Bot
+from aiogram.types.input_file import InputFile
+
+from models import DailyHistory
+
+EXPORT_FIELDS = ['date', 'water', 'water_goal', 'calories_consumed', 'calories_burned', 'calorie_goal']
+# Сколько строк форматируется и сжимается за один шаг перед возвратом управления циклу событий
+EXPORT_ROWS_PER_CHUNK = 500
+
+
+def iter_history_rows(history: DailyHistory) -> Iterator[Dict[str, Any]]:
+    """Отдаёт записи истории по одной в порядке дат"""
+    for record in history:
+        yield {
+            'date': date.fromordinal(record.day).isoformat(),
+            'water': record.water,
+            'water_goal': record.water_goal,
+            # Калории хранятся как float32 — округляем, чтобы не выгружать шум младших разрядов
+            'calories_consumed': round(record.calories_consumed, 1),
+            'calories_burned': round(record.calories_burned, 1),
+            'calorie_goal': record.calorie_goal
+        }
+
+
+def iter_csv_chunks(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Форматирует строки в CSV, отдавая текст кусками по EXPORT_ROWS_PER_CHUNK строк"""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % EXPORT_ROWS_PER_CHUNK == 0:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+
+def iter_ndjson_chunks(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Форматирует строки в NDJSON (один JSON-объект на строку) кусками"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, ensure_ascii=False))
+        if len(lines) == EXPORT_ROWS_PER_CHUNK:
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+            lines.clear()
+    if lines:
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Потоково сжимает куски в формат gzip"""
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+EXPORT_FORMATS = {
+    'csv': iter_csv_chunks,
+    'json': iter_ndjson_chunks,
+}
+
+
+class HistoryExportFile(InputFile):
+    """Файл выгрузки истории, который формируется по ходу загрузки в Telegram.
+
+    Весь файл в памяти не собирается: между кусками управление
+    возвращается циклу событий, поэтому выгрузка не блокирует бота.
+    """
+
+    def __init__(self, history: DailyHistory, fmt: str = 'csv'):
+        extension = 'csv' if fmt == 'csv' else 'ndjson'
+        super().__init__(filename=f"history.{extension}.gz")
+        self.history = history
+        self.fmt = fmt
+
+    async def read(self, bot: Bot) -> AsyncGenerator[bytes, None]:
+        rows = iter_history_rows(self.history)
+        for chunk in iter_gzip(EXPORT_FORMATS[self.fmt](rows)):
+            yield chunk
+            await asyncio.sleep(0)
@@ -0,0 +1,336 @@
+"""Локальный индекс продуктов OpenFoodFacts.
+
+Индекс — файл SQLite, который открывается только на чтение с отображением
+в память. Наполняется потоковой загрузкой дампа (JSONL или CSV, можно gzip):
+
+    python food_index.py openfoodfacts-products.jsonl.gz --db products.db
+
+Повторный запуск с дельта-файлом обновляет только изменившиеся продукты.
+Кроме поиска по названию индекс находит продукт по штрихкоду (EAN/UPC).
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Сколько строк дампа разбирает один процесс за задачу
+INGEST_BATCH_SIZE = 5000
+MMAP_SIZE = 256 * 1024 * 1024
+# Сколько продуктов с подходящим префиксом сравнивается при поиске
+PREFIX_CANDIDATES = 200
+# Длины штрихкодов: EAN-8, UPC-A, EAN-13, GTIN-14
+BARCODE_LENGTHS = (8, 12, 13, 14)
+# Сколько ответов OpenFoodFacts по штрихкоду хранится в памяти и сколько помнится,
+# что продукта нет (его могут добавить в базу)
+BARCODE_CACHE_SIZE = 10000
+BARCODE_MISS_TTL = 3600.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    barcode TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_lc TEXT NOT NULL,
+    calories REAL NOT NULL,
+    serving_size TEXT,
+    modified INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS products_name_lc ON products (name_lc);
+"""
+
+UPSERT = """
+INSERT INTO products (barcode, name, name_lc, calories, serving_size, modified)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (barcode) DO UPDATE SET
+    name = excluded.name,
+    name_lc = excluded.name_lc,
+    calories = excluded.calories,
+    serving_size = excluded.serving_size,
+    modified = excluded.modified
+WHERE excluded.modified >= products.modified
+"""
+
+
+def parse_product(product: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Извлекает название, калорийность и порцию из продукта OpenFoodFacts.
+
+    Возвращает None, если у продукта нет калорийности или названия.
+    """
+    try:
+        # Получаем название на русском или английском
+        name = (
+            product.get('product_name_ru') or
+            product.get('product_name') or
+            'Неизвестный продукт'
+        ).strip()
+
+        nutriments = product.get('nutriments', {})
+        calories = (
+            nutriments.get('energy-kcal_100g') or
+            nutriments.get('energy_100g', 0) / 4.184 or
+            0
+        )
+
+        if calories > 0 and name and name.lower() != 'unknown':
+            return {
+                'name': name.capitalize(),
+                'calories': round(float(calories), 1),
+                'serving_size': product.get('serving_size', '100г'),
+                'barcode': product.get('code')
+            }
+    except (TypeError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def normalize_barcode(text: str) -> Optional[str]:
+    """Возвращает штрихкод из введённого текста (пробелы и дефисы допускаются)
+    или None, если это не штрихкод с правильной контрольной цифрой"""
+    code = text.replace(' ', '').replace('-', '')
+    if not code.isdigit() or len(code) not in BARCODE_LENGTHS:
+        return None
+    digits = [int(c) for c in code]
+    # Веса 3 и 1 чередуются справа налево, начиная с цифры перед контрольной
+    total = sum(d * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits[:-1])))
+    if (10 - total % 10) % 10 != digits[-1]:
+        return None
+    return code
+
+
+def barcode_variants(code: str) -> Tuple[str, ...]:
+    """Записи одного и того же кода в базе: UPC-A хранится и как есть, и как EAN-13 с ведущим нулём"""
+    variants = [code]
+    if len(code) < 13:
+        variants.append(code.zfill(13))
+    if len(code) >= 13 and code[0] == '0':
+        variants.append(code[1:])
+    return tuple(variants)
+
+
+def _number(value: str) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def csv_row_to_product(row: Dict[str, str]) -> Dict[str, Any]:
+    """Приводит строку CSV-дампа к структуре продукта из JSON API"""
+    return {
+        'code': row.get('code'),
+        'product_name_ru': row.get('product_name_ru'),
+        'product_name': row.get('product_name'),
+        'serving_size': row.get('serving_size') or '100г',
+        'last_modified_t': row.get('last_modified_t'),
+        'nutriments': {
+            'energy-kcal_100g': _number(row.get('energy-kcal_100g')),
+            'energy_100g': _number(row.get('energy_100g')) or 0,
+        },
+    }
+
+
+def _to_record(product: Dict[str, Any]) -> Optional[Tuple]:
+    food = parse_product(product)
+    if not food or not food['barcode']:
+        return None
+    try:
+        modified = int(product.get('last_modified_t') or 0)
+    except (TypeError, ValueError):
+        modified = 0
+    return (
+        str(food['barcode']), food['name'], food['name'].lower(),
+        food['calories'], food['serving_size'], modified
+    )
+
+
+def parse_batch(args: Tuple[str, Optional[List[str]], List[str]]) -> List[Tuple]:
+    """Разбирает пачку строк дампа в записи индекса (выполняется в процессе пула)"""
+    fmt, header, lines = args
+    records = []
+    if fmt == 'csv':
+        rows = (dict(zip(header, fields)) for fields in csv.reader(lines, delimiter='\t', quoting=csv.QUOTE_NONE))
+        products = (csv_row_to_product(row) for row in rows)
+    else:
+        products = (_loads(line) for line in lines)
+    for product in products:
+        record = _to_record(product) if product else None
+        if record:
+            records.append(record)
+    return records
+
+
+def _loads(line: str) -> Optional[Dict[str, Any]]:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def _open_dump(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'rt', encoding='utf-8', errors='replace')
+
+
+def iter_batches(path: str) -> Iterator[Tuple[str, Optional[List[str]], List[str]]]:
+    """Потоково читает дамп и отдаёт пачки строк по INGEST_BATCH_SIZE"""
+    fmt = 'csv' if '.csv' in os.path.basename(path) else 'jsonl'
+    with _open_dump(path) as f:
+        header = f.readline().rstrip('\n').split('\t') if fmt == 'csv' else None
+        batch = []
+        for line in f:
+            batch.append(line)
+            if len(batch) == INGEST_BATCH_SIZE:
+                yield fmt, header, batch
+                batch = []
+        if batch:
+            yield fmt, header, batch
+
+
+def ingest(path: str, db_path: str, workers: int = 0) -> int:
+    """Загружает дамп в индекс; возвращает число записанных продуктов.
+
+    Чтение и распаковка идут в основном процессе, разбор — в пуле процессов.
+    В работе одновременно не больше 2 пачек на процесс, поэтому память
+    не зависит от размера дампа.
+    """
+    import multiprocessing
+
+    workers = workers or os.cpu_count() or 1
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    written = 0
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+
+        def flush_one():
+            nonlocal written
+            records = pending.popleft().get()
+            with conn:
+                conn.executemany(UPSERT, records)
+            written += len(records)
+
+        for batch in iter_batches(path):
+            pending.append(pool.apply_async(parse_batch, (batch,)))
+            if len(pending) >= workers * 2:
+                flush_one()
+        while pending:
+            flush_one()
+
+    conn.execute("ANALYZE")
+    conn.close()
+    return written
+
+
+class FoodIndex:
+    """Поиск по локальному индексу продуктов (только чтение)"""
+
+    def __init__(self, db_path: str):
+        self._conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        # Индекс используется и из цикла событий, и из пула потоков
+        self._lock = threading.Lock()
+
+    def search(self, product_name: str) -> Optional[Dict[str, Any]]:
+        """Ищет продукт по точному названию, затем по префиксу (самые короткие названия первыми)"""
+        query = product_name.strip().lower()
+        if not query:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT name, calories, serving_size FROM products WHERE name_lc = ? LIMIT 1",
+                (query,)
+            ).fetchone()
+        if row is not None:
+            name, calories, serving_size = row
+            return {'name': name, 'calories': calories, 'serving_size': serving_size}
+        found = self.search_prefix(query, 1)
+        return found[0] if found else None
+
+    def lookup_barcode(self, code: str) -> Optional[Dict[str, Any]]:
+        """Продукт по штрихкоду — поиск по первичному ключу"""
+        variants = barcode_variants(code)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT name, calories, serving_size FROM products "
+                f"WHERE barcode IN ({', '.join('?' * len(variants))}) LIMIT 1",
+                variants
+            ).fetchone()
+        if row is None:
+            return None
+        name, calories, serving_size = row
+        return {'name': name, 'calories': calories, 'serving_size': serving_size}
+
+    def search_prefix(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """Продукты, название которых начинается с prefix, — самые короткие названия первыми"""
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name, calories, serving_size FROM ("
+                "SELECT name, calories, serving_size, name_lc FROM products "
+                "WHERE name_lc >= ? AND name_lc < ? LIMIT ?"
+                ") ORDER BY length(name_lc) LIMIT ?",
+                (prefix, prefix + '\uffff', PREFIX_CANDIDATES, limit)
+            ).fetchall()
+        return [
+            {'name': name, 'calories': calories, 'serving_size': serving_size}
+            for name, calories, serving_size in rows
+        ]
+
+
+class BarcodeCache:
+    """Ответы OpenFoodFacts по штрихкоду, в том числе «продукта нет».
+
+    Найденные продукты хранятся, пока не вытеснены (LRU), отсутствующие —
+    BARCODE_MISS_TTL секунд.
+    """
+
+    def __init__(self, size: int = BARCODE_CACHE_SIZE, miss_ttl: float = BARCODE_MISS_TTL):
+        self.size = size
+        self.miss_ttl = miss_ttl
+        # Штрихкод -> (продукт или None, когда запись устаревает)
+        self._entries: 'OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]' = OrderedDict()
+
+    def get(self, code: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Возвращает (есть ли ответ в кэше, продукт или None)"""
+        entry = self._entries.get(code)
+        if entry is None:
+            return False, None
+        food, expires = entry
+        if expires < time.monotonic():
+            del self._entries[code]
+            return False, None
+        self._entries.move_to_end(code)
+        return True, food
+
+    def put(self, code: str, food: Optional[Dict[str, Any]]):
+        expires = float('inf') if food is not None else time.monotonic() + self.miss_ttl
+        self._entries[code] = (food, expires)
+        self._entries.move_to_end(code)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка дампа OpenFoodFacts в локальный индекс продуктов")
+    parser.add_argument('dump', help="файл дампа: .jsonl, .csv (можно .gz)")
+    parser.add_argument('--db', default='products.db', help="путь к файлу индекса")
+    parser.add_argument('--workers', type=int, default=0, help="число процессов (по умолчанию — все ядра)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    written = ingest(args.dump, args.db, args.workers)
+    print(f"Записано продуктов: {written} за {time.perf_counter() - started:.1f} с", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
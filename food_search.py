@@ -0,0 +1,138 @@
+"""Постраничный поиск продуктов в OpenFoodFacts с кэшем страниц.
+
+Страница результатов запрашивается один раз на запрос и номер страницы:
+повторный показ, выбор продукта и листание берут её из кэша, а следующая
+страница загружается заранее в фоне, пока пользователь смотрит текущую.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+from food_index import parse_product
+from upstream import Upstream, UpstreamError, set_update_deadline
+
+SEARCH_URL = "https://world.openfoodfacts.org/cgi/search.pl"
+# Продуктов на странице выбора (кнопки в одном сообщении)
+PAGE_SIZE = 6
+# Сколько страниц хранится и сколько секунд они считаются свежими
+PAGE_CACHE_SIZE = 2000
+PAGE_TTL = 3600.0
+
+
+class SearchPage(NamedTuple):
+    foods: Tuple[Dict[str, Any], ...]  # кандидаты по убыванию соответствия запросу
+    has_more: bool  # есть ли у OpenFoodFacts следующая страница
+
+
+def _match_rank(query: str, name: str) -> int:
+    name = name.lower()
+    if name == query:
+        return 0
+    if name.startswith(query):
+        return 1
+    if query in name:
+        return 2
+    return 3
+
+
+def rank_candidates(query: str, products: list) -> Tuple[Dict[str, Any], ...]:
+    """Разбирает продукты ответа и упорядочивает: точное совпадение названия, начало названия,
+    вхождение, остальное; внутри группы — порядок OpenFoodFacts. Повторы (название и калорийность) убираются."""
+    query = query.strip().lower()
+    foods, seen = [], set()
+    for product in products:
+        food = parse_product(product)
+        if not food or (food['name'], food['calories']) in seen:
+            continue
+        seen.add((food['name'], food['calories']))
+        foods.append({'name': food['name'], 'calories': food['calories'], 'serving_size': food['serving_size']})
+    foods.sort(key=lambda f: _match_rank(query, f['name']))
+    return tuple(foods)
+
+
+class FoodSearchPages:
+    """Кэш страниц поиска OpenFoodFacts с объединением одинаковых запросов и предзагрузкой"""
+
+    def __init__(self, upstream: Upstream, page_size: int = PAGE_SIZE,
+                 cache_size: int = PAGE_CACHE_SIZE, ttl: float = PAGE_TTL):
+        self.upstream = upstream
+        self.page_size = page_size
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._pages: 'OrderedDict[Tuple[str, int], Tuple[SearchPage, float]]' = OrderedDict()
+        self._inflight: Dict[Tuple[str, int], asyncio.Task] = {}
+        self.stats = {'hits': 0, 'fetches': 0, 'prefetches': 0}
+
+    @staticmethod
+    def _key(query: str, page: int) -> Tuple[str, int]:
+        return ' '.join(query.lower().split()), page
+
+    def cached(self, query: str, page: int) -> Optional[SearchPage]:
+        key = self._key(query, page)
+        entry = self._pages.get(key)
+        if entry is None:
+            return None
+        result, expires = entry
+        if expires < time.monotonic():
+            del self._pages[key]
+            return None
+        self._pages.move_to_end(key)
+        return result
+
+    async def get(self, query: str, page: int = 1) -> Optional[SearchPage]:
+        """Страница page результатов по запросу; None, если OpenFoodFacts недоступен (такое не кэшируется).
+
+        Если эта страница уже загружается (например, предзагрузкой), ожидает ту же загрузку.
+        """
+        result = self.cached(query, page)
+        if result is not None:
+            self.stats['hits'] += 1
+            return result
+        task = self._inflight.get(self._key(query, page))
+        if task is None:
+            self.stats['fetches'] += 1
+            task = self._start(query, page)
+        return await asyncio.shield(task)
+
+    def prefetch(self, query: str, page: int):
+        """Загружает страницу в фоне, если её нет в кэше и она ещё не загружается"""
+        key = self._key(query, page)
+        if key in self._inflight or self.cached(query, page) is not None:
+            return
+        self.stats['prefetches'] += 1
+        self._start(query, page, own_deadline=True)
+
+    def _start(self, query: str, page: int, own_deadline: bool = False) -> asyncio.Task:
+        key = self._key(query, page)
+        task = self._inflight[key] = asyncio.create_task(self._fetch(key, own_deadline))
+        task.add_done_callback(lambda t: self._inflight.pop(key, None))
+        return task
+
+    async def _fetch(self, key: Tuple[str, int], own_deadline: bool) -> Optional[SearchPage]:
+        query, page = key
+        if own_deadline:
+            # Предзагрузка не должна расходовать бюджет времени обновления, которое её запустило
+            set_update_deadline()
+        try:
+            status, data = await self.upstream.get_json(SEARCH_URL, params={
+                'action': 'process',
+                'search_terms': query,
+                'json': 1,
+                'page': page,
+                'page_size': self.page_size,
+            })
+        except UpstreamError:
+            return None
+        if status != 200 or not isinstance(data, dict):
+            return None
+        try:
+            count = int(data.get('count') or 0)
+        except (TypeError, ValueError):
+            count = 0
+        result = SearchPage(rank_candidates(query, data.get('products') or []), count > page * self.page_size)
+        self._pages[key] = (result, time.monotonic() + self.ttl)
+        self._pages.move_to_end(key)
+        if len(self._pages) > self.cache_size:
+            self._pages.popitem(last=False)
+        return result
@@ -1,60 +1,69 @@
 import asyncio
 import os
-import requests
-import urllib.parse
-from datetime import datetime
-from typing import Optional, Dict, Any, List
-from io import BytesIO
-
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import time
+from datetime import date, datetime
+from typing import Optional, Dict, Any, List, Tuple
 
 from aiogram import Bot, Router
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, BufferedInputFile
+from aiogram.types import (
+    Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, BufferedInputFile, FSInputFile,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+)
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest
 
 from states import ProfileForm, WaterForm, FoodForm, WorkoutForm
+from models import User
+from callbacks import (
+    QuickFoodCallback, QuickWorkoutCallback, WaterPresetCallback, WorkoutPresetCallback, FoodPickCallback, FoodPageCallback
+)
+from scheduler import RolloverScheduler, ReminderScheduler, local_date, next_local_time_ts
+from notifications import RateLimitedSender
+from export import EXPORT_FORMATS, HistoryExportFile
+from food_index import normalize_barcode, parse_product
+from food_search import SearchPage
+from leaderboard import Leaderboard
+from upstream import UpstreamError
+from weather import city_key
+from charts import ChartCache, prerender_charts, render_progress_chart
+from dashboard import LiveDashboard
+from analytics import Analytics
+from tenants import current_tenant
+from services import (
+    admission, chart_executor, chart_prerender_lock, profiler, execution, catalogs,
+    food_upstream, weather_cache, barcode_cache, food_pages, get_food_index, suggester, start_shared_tasks
+)
+
+from config import (
+    CHART_PRERENDER_HOUR, CHART_PRERENDER_PROCESSES, CHART_BYTE_BUDGET,
+    WATER_GOAL_REFRESH_HOUR
+)
+# Бот, которого обслуживает эта копия модуля (при нескольких ботах в процессе — см. tenants.py)
+tenant = current_tenant()
+ADMIN_IDS = tenant.admin_ids
 
-from config import OPENWEATHER_API_KEY
 router = Router()
 
-users: Dict[int, Dict[str, Any]] = {}
-
+users: Dict[int, User] = {}
 
+# Рейтинг по текущей серии дней с выполненной нормой воды
+leaderboard = Leaderboard()
+# Готовые графики /show_stats: ночная отрисовка и file_id уже отправленных
+chart_cache = ChartCache(tenant.chart_cache_dir)
 
-LOW_CAL_FOODS = [
-    {"name": "банан", "calories": 89, "portion": 100, "emoji": "🍌"},
-    {"name": "яблоко", "calories": 52, "portion": 100, "emoji": "🍎"},
-    {"name": "огурец", "calories": 15, "portion": 100, "emoji": "🥒"},
-    {"name": "морковь", "calories": 41, "portion": 100, "emoji": "🥕"},
-    {"name": "йогурт натуральный", "calories": 59, "portion": 100, "emoji": "🍶"},
-    {"name": "яйцо варёное", "calories": 155, "portion": 50, "emoji": "🥚"},  # 1 яйцо ~50г
-    {"name": "творог 5%", "calories": 120, "portion": 100, "emoji": "🧀"},
-]
 
-BURN_WORKOUTS = [
-    {"name": "ходьба", "cal_per_min": 4, "emoji": "🚶", "intensity": "лёгкая"},
-    {"name": "бег трусцой", "cal_per_min": 8, "emoji": "🏃", "intensity": "средняя"},
-    {"name": "велосипед", "cal_per_min": 8, "emoji": "🚴", "intensity": "средняя"},
-    {"name": "прыжки на скакалке", "cal_per_min": 12, "emoji": "🤸", "intensity": "интенсивная"},
-    {"name": "танцы", "cal_per_min": 6, "emoji": "💃", "intensity": "средняя"},
-]
+# Смещение часового пояса сервера — используется, пока город пользователя неизвестен
+DEFAULT_UTC_OFFSET = int(datetime.now().astimezone().utcoffset().total_seconds())
+# Сводные счётчики для /admin_stats, обновляются при каждой записи и нажатии
+analytics = Analytics(DEFAULT_UTC_OFFSET)
 
 
 def ensure_user_exists(user_id: int):
     """Гарантирует, что пользователь существует в словаре users с историей"""
     if user_id not in users:
-        users[user_id] = {
-            'weight': None, 'height': None, 'age': None, 'gender': None,
-            'activity': None, 'city': None, 'water_goal': 2000, 'calorie_goal': 2000,
-            'logged_water': 0, 'logged_calories': 0, 'burned_calories': 0,
-            'last_update': datetime.now(),
-            'pending_food': None,
-            'history': {}
-        }
+        users[user_id] = User(DEFAULT_UTC_OFFSET, local_date(DEFAULT_UTC_OFFSET))
+        rollover.add_user(user_id, DEFAULT_UTC_OFFSET)
 
 
 def is_profile_complete(user_id: int) -> bool:
@@ -72,58 +81,172 @@ def is_profile_complete(user_id: int) -> bool:
     ])
 
 
-def reset_daily_data(user_id: int):
-    """Сбрасывает данные за день при первом обращении после полуночи"""
-    user = users.get(user_id)
-    if not user:
-        return
-    
+def finalize_day(user_ids: List[int]):
+    """Закрывает день для группы пользователей одного часового пояса.
+
+    Записывает итоги дня в историю (в том числе для дней без активности),
+    подводит итоги серий и обнуляет дневные счётчики.
+    """
     now = datetime.now()
-    last_update = user.get('last_update', now)
-    
-    if (now - last_update).days >= 1:
+    for user_id in user_ids:
+        user = users.get(user_id)
+        if not user:
+            continue
+        new_day = local_date(user['utc_offset'])
+        if new_day <= user['day']:
+            continue
+        save_daily_stats(user_id)
+        close_day_achievements(user_id)
         user.update({
             'logged_water': 0,
             'logged_calories': 0,
             'burned_calories': 0,
-            'last_update': now
+            'last_update': now,
+            'day': new_day
         })
 
 
-def save_daily_stats(user_id: int):
-    """Сохраняет текущие данные пользователя в историю за сегодня"""
+rollover = RolloverScheduler(finalize_day)
+
+
+def set_user_utc_offset(user_id: int, offset: int):
+    """Меняет часовой пояс пользователя и переносит его в нужную группу планировщика"""
+    user = users[user_id]
+    rollover.move_user(user_id, user['utc_offset'], offset)
+    user['utc_offset'] = offset
+    new_day = local_date(offset)
+    # В новом поясе уже наступил следующий день — закрываем текущий сразу
+    if new_day > user['day']:
+        finalize_day([user_id])
+    # В новом поясе ещё идёт предыдущий день — продолжаем его, иначе ближайшая полночь не закроет день
+    elif new_day < user['day']:
+        user['day'] = new_day
+    if user['reminders']:
+        schedule_user_reminders(user_id)
+
+
+# Локальное время напоминаний (секунды от полуночи)
+REMINDER_TIMES = {
+    'water': 15 * 3600,
+    'food': 20 * 3600,
+}
+# Доля нормы воды, которую стоит выпить к времени напоминания
+WATER_REMINDER_SHARE = 0.5
+WATER_REMINDER_MIN_LAG = 250
+
+
+def build_reminder_text(user_id: int, kind: str) -> Optional[str]:
+    """Формирует текст напоминания по текущим данным пользователя или None, если напоминать не о чем"""
+    user = users.get(user_id)
+    if not user:
+        return None
+    
+    if kind == 'water':
+        lag = user['water_goal'] * WATER_REMINDER_SHARE - user['logged_water']
+        if lag >= WATER_REMINDER_MIN_LAG:
+            return (
+                f"💧 Вы отстаёте от нормы воды на {lag:.0f} мл.\n"
+                f"Выпито: {user['logged_water']:.0f} мл из {user['water_goal']} мл. Запишите: /log_water"
+            )
+    elif kind == 'food':
+        if user['logged_calories'] == 0:
+            return "🍎 Сегодня ещё не записано ни одного приёма пищи. Запишите: /log_food"
+    return None
+
+
+def on_reminder(user_id: int, kind: str, fire_at: float):
+    """Срабатывание напоминания: отправляет текст и планирует напоминание на завтра"""
     user = users.get(user_id)
     if not user:
         return
+    text = build_reminder_text(user_id, kind)
+    if text:
+        sender.enqueue(user_id, text)
+    reminders.schedule(user_id, kind, next_local_time_ts(user['utc_offset'], REMINDER_TIMES[kind], fire_at))
+
+
+def disable_reminders(user_id: int):
+    """Отключает напоминания пользователя"""
+    reminders.disable(user_id)
+    if user_id in users:
+        users[user_id]['reminders'] = False
+
+
+def schedule_user_reminders(user_id: int):
+    """(Пере)планирует все напоминания пользователя с учётом его часового пояса"""
+    offset = users[user_id]['utc_offset']
+    reminders.enable(user_id)
+    for kind, seconds in REMINDER_TIMES.items():
+        reminders.schedule(user_id, kind, next_local_time_ts(offset, seconds))
+
+
+reminders = ReminderScheduler(on_reminder)
+sender = RateLimitedSender(on_blocked=disable_reminders)
+
+
+# Длины серий, за которые выдаются достижения
+STREAK_MILESTONES = (3, 7, 14, 30, 60, 100, 365)
+# Норма калорий считается выполненной при отклонении не больше 10%
+CALORIE_GOAL_TOLERANCE = 0.1
+
+
+def update_water_streak(user_id: int) -> Optional[int]:
+    """Засчитывает сегодняшний день в серию, если норма воды выполнена.
+
+    Вызывается при каждом сохранении, но день засчитывается один раз.
+    Возвращает длину серии, если она только что достигла одного из STREAK_MILESTONES.
+    """
+    user = users[user_id]
+    today = user.day.toordinal()
+    if user.streak_day == today or user.logged_water < user.water_goal:
+        return None
     
-    today = datetime.now().date().isoformat()
+    user.water_streak = user.water_streak + 1 if user.streak_day == today - 1 else 1
+    user.streak_day = today
+    user.best_water_streak = max(user.best_water_streak, user.water_streak)
+    user.water_goal_days += 1
+    leaderboard.update(user_id, user.water_streak)
+    return user.water_streak if user.water_streak in STREAK_MILESTONES else None
+
+
+def close_day_achievements(user_id: int):
+    """Подводит итоги закрываемого дня: обрывает серию воды и засчитывает норму калорий"""
+    user = users[user_id]
+    if user.water_streak and user.streak_day < user.day.toordinal():
+        user.water_streak = 0
+        leaderboard.update(user_id, 0)
     
-    if today not in user['history']:
-        user['history'][today] = {
-            'water': 0,
-            'calories_consumed': 0,
-            'calories_burned': 0,
-            'water_goal': user['water_goal'],
-            'calorie_goal': user['calorie_goal']
-        }
+    net_calories = user.logged_calories - user.burned_calories
+    if user.calorie_goal and abs(net_calories - user.calorie_goal) <= user.calorie_goal * CALORIE_GOAL_TOLERANCE:
+        user.calorie_goal_days += 1
+
+
+def save_daily_stats(user_id: int) -> Optional[int]:
+    """Сохраняет текущие данные пользователя в историю за текущий день.
+
+    Возвращает длину серии воды, если достигнуто новое достижение.
+    """
+    user = users.get(user_id)
+    if not user:
+        return None
     
-    user['history'][today].update({
-        'water': user['logged_water'],
-        'calories_consumed': user['logged_calories'],
-        'calories_burned': user['burned_calories'],
-        'water_goal': user['water_goal'],
-        'calorie_goal': user['calorie_goal']
-    })
+    user.history.upsert(
+        user.day.toordinal(),
+        user.logged_water,
+        user.logged_calories,
+        user.burned_calories,
+        user.water_goal,
+        user.calorie_goal
+    )
+    return update_water_streak(user_id)
 
 
 def get_last_n_days_data(user_id: int, n: int = 7) -> tuple:
     """Возвращает данные за последние N дней для построения графиков"""
     user = users.get(user_id)
-    if not user or not user['history']:
+    if not user or not user.history:
         return [], [], [], [], [], []
     
-    sorted_dates = sorted(user['history'].keys())[-n:]
-    
     dates = []
     water_values = []
     water_goals = []
@@ -131,80 +254,70 @@ def get_last_n_days_data(user_id: int, n: int = 7) -> tuple:
     calories_burned = []
     calorie_goals = []
     
-    for d in sorted_dates:
-        record = user['history'][d]
-        dates.append(d[5:])
-        water_values.append(record['water'])
-        water_goals.append(record['water_goal'])
-        calories_consumed.append(record['calories_consumed'])
-        calories_burned.append(record['calories_burned'])
-        calorie_goals.append(record['calorie_goal'])
+    for record in user.history.last(n):
+        dates.append(date.fromordinal(record.day).isoformat()[5:])
+        water_values.append(record.water)
+        water_goals.append(record.water_goal)
+        calories_consumed.append(record.calories_consumed)
+        calories_burned.append(record.calories_burned)
+        calorie_goals.append(record.calorie_goal)
     
     return dates, water_values, water_goals, calories_consumed, calories_burned, calorie_goals
 
 
-def create_progress_charts(user_id: int) -> BytesIO | None:
-    """Создаёт графики прогресса и возвращает изображение в буфере"""
+def is_chart_active(user_id: int) -> bool:
+    """Есть ли у пользователя записи воды, еды или тренировок за последние 7 дней"""
+    user = users.get(user_id)
+    if not user or not user.history or not is_profile_complete(user_id):
+        return False
+    return any(r.water or r.calories_consumed or r.calories_burned for r in user.history.last(7))
+
+
+async def prerender_active_charts() -> int:
+    """Заранее строит графики активных пользователей в пуле процессов; возвращает их число"""
+    jobs = []
+    for user_id in list(users):
+        if not is_chart_active(user_id):
+            continue
+        # Сегодняшняя запись нужна в графике так же, как при /show_stats
+        save_daily_stats(user_id)
+        data = get_last_n_days_data(user_id, 7)
+        if chart_cache.get(user_id, data):
+            continue
+        jobs.append((user_id, data, chart_cache.base_path(user_id)))
+    if not jobs:
+        return 0
+
+    os.makedirs(chart_cache.directory, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    async with chart_prerender_lock:
+        done = await loop.run_in_executor(None, prerender_charts, jobs, CHART_PRERENDER_PROCESSES, CHART_BYTE_BUDGET)
+    data_by_user = {user_id: data for user_id, data, _ in jobs}
+    for user_id, path in done:
+        chart_cache.store_file(user_id, data_by_user[user_id], path)
+    return len(done)
+
+
+async def run_chart_prerender():
+    """Каждую ночь в CHART_PRERENDER_HOUR строит графики до вечернего пика /show_stats"""
+    while True:
+        fire_at = next_local_time_ts(DEFAULT_UTC_OFFSET, CHART_PRERENDER_HOUR * 3600)
+        await asyncio.sleep(fire_at - time.time())
+        try:
+            count = await prerender_active_charts()
+            print(f"🖼 Заранее построено графиков: {count}")
+        except Exception as e:
+            print(f"Ошибка пакетной отрисовки графиков: {e}")
+
+
+def format_stats_summary(user_id: int) -> str:
+    """Текстовая сводка за 7 дней — облегчённая замена графика при перегрузке"""
     dates, water_vals, water_goals, cal_cons, cal_burn, cal_goals = get_last_n_days_data(user_id, 7)
-    
-    if not dates:
-        return None
-    
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8))
-    fig.suptitle('Прогресс за последние 7 дней', fontsize=16, fontweight='bold', color='#2C3E50')
-    
-    x = range(len(dates))
-    ax1.bar(x, water_vals, color='#3498DB', alpha=0.85, label='Выпито', edgecolor='white', linewidth=1.5)
-    ax1.plot(x, water_goals, 'r--', marker='o', linewidth=2.5, label='Норма', markersize=8, color='#E74C3C')
-    
-    for i, (val, goal) in enumerate(zip(water_vals, water_goals)):
-        ax1.text(i, val + max(water_goals) * 0.03, f'{int(val)} мл', 
-                ha='center', va='bottom', fontsize=9, fontweight='bold', color='#2C3E50')
-        if val >= goal:
-            ax1.text(i, goal * 0.3, ha='center', va='center', 
-                    fontsize=16, color='green', fontweight='bold')
-    
-    ax1.set_xticks(x)
-    ax1.set_xticklabels(dates, rotation=45, ha='right', fontsize=10)
-    ax1.set_ylabel('Вода (мл)', fontsize=12, fontweight='bold', color='#2C3E50')
-    ax1.set_title('Потребление воды', fontsize=14, pad=12, color='#2C3E50')
-    ax1.legend(loc='upper left', frameon=True, shadow=True)
-    ax1.grid(axis='y', alpha=0.3, linestyle='--')
-    ax1.set_ylim(0, max(max(water_goals) * 1.25, max(water_vals) * 1.25) if water_vals else 2500)
-    ax1.set_facecolor('#F8F9FA')
-    
-    width = 0.35
-    ax2.bar([i - width/2 for i in x], cal_cons, width, 
-           color='#E67E22', alpha=0.85, label='Потреблено', edgecolor='white', linewidth=1.5)
-    ax2.bar([i + width/2 for i in x], cal_burn, width, 
-           color='#1ABC9C', alpha=0.85, label='Сожжено', edgecolor='white', linewidth=1.5)
-    ax2.plot(x, cal_goals, 'r--', marker='o', linewidth=2.5, label='Норма', markersize=8, color='#E74C3C')
-    
-    for i, (cons, burn, goal) in enumerate(zip(cal_cons, cal_burn, cal_goals)):
-        net = cons - burn
-        color = 'green' if net <= goal else '#E67E22'
-        ax2.text(i, max(cons, burn) + max(cal_goals) * 0.05, 
-                f'{int(net)}', ha='center', va='bottom', 
-                fontsize=10, fontweight='bold', color=color)
-    
-    ax2.set_xticks(x)
-    ax2.set_xticklabels(dates, rotation=45, ha='right', fontsize=10)
-    ax2.set_ylabel('Калории (ккал)', fontsize=12, fontweight='bold', color='#2C3E50')
-    ax2.set_title('Баланс калорий (потреблено - сожжено)', fontsize=14, pad=12, color='#2C3E50')
-    ax2.legend(loc='upper left', frameon=True, shadow=True)
-    ax2.grid(axis='y', alpha=0.3, linestyle='--')
-    ax2.set_ylim(0, max(max(cal_goals) * 1.35, max(cal_cons + cal_burn) * 1.35) if (cal_cons or cal_burn) else 3000)
-    ax2.set_facecolor('#F8F9FA')
-    
-    fig.patch.set_facecolor('white')
-    plt.tight_layout()
-    
-    buf = BytesIO()
-    plt.savefig(buf, format='png', dpi=150, bbox_inches='tight', facecolor='white')
-    plt.close(fig)
-    buf.seek(0)
-    
-    return buf
+    lines = ["📈 Прогресс за последние 7 дней:\n"]
+    for d, water, water_goal, cons, burn, cal_goal in zip(dates, water_vals, water_goals, cal_cons, cal_burn, cal_goals):
+        lines.append(f"{d}: 💧 {water:.0f}/{water_goal} мл, 🔥 {cons - burn:.0f}/{cal_goal} ккал")
+    return "\n".join(lines)
+
 
 def get_food_recommendations(user_id: int) -> List[Dict[str, Any]]:
     """Возвращает рекомендации низкокалорийных продуктов при недоборе калорий"""
@@ -219,8 +332,8 @@ def get_food_recommendations(user_id: int) -> List[Dict[str, Any]]:
         return []
     
     recommendations = []
-    for food in LOW_CAL_FOODS:
-        portion_calories = food['calories'] * food['portion'] / 100
+    for food in catalogs.current.low_cal_foods:
+        portion_calories = food['portion_calories']
         portions_needed = min(3, max(1, int((deficit * 0.3) / portion_calories)))
         total_calories = portion_calories * portions_needed
         
@@ -248,7 +361,7 @@ def get_workout_recommendations(user_id: int) -> List[Dict[str, Any]]:
         return []
     
     recommendations = []
-    for workout in BURN_WORKOUTS:
+    for workout in catalogs.current.burn_workouts:
         minutes_needed = min(60, max(10, int((surplus * 0.4) / workout['cal_per_min'])))
         calories_burned = workout['cal_per_min'] * minutes_needed
         
@@ -305,6 +418,68 @@ def format_recommendations(user_id: int) -> str:
     return "\n".join(parts) if parts else ""
 
 
+def format_daily_progress(user_id: int) -> str:
+    """Текст прогресса за день: шкалы воды и калорий"""
+    u = users[user_id]
+    net_calories = u['logged_calories'] - u['burned_calories']
+    
+    water_pct = min(100, int(u['logged_water'] / u['water_goal'] * 100))
+    water_bar = '█' * (water_pct // 10) + '░' * (10 - water_pct // 10)
+    
+    calorie_pct = min(100, int(net_calories / u['calorie_goal'] * 100)) if u['calorie_goal'] > 0 else 0
+    calorie_bar = '█' * (calorie_pct // 10) + '░' * (10 - calorie_pct // 10)
+    
+    response = "📊 Ежедневный прогресс:\n\n"
+    response += f"💧 Вода:\n{water_bar} {water_pct}%\n"
+    response += f"Выпито: {u['logged_water']:.0f} мл из {u['water_goal']} мл\n"
+    
+    if u['logged_water'] >= u['water_goal']:
+        response += "✅ Норма воды выполнена!\n"
+    else:
+        response += f"Осталось: {u['water_goal'] - u['logged_water']:.0f} мл\n"
+    
+    response += "\n🔥 Калории:\n"
+    response += f"{calorie_bar} {calorie_pct}%\n"
+    response += f"Потреблено: {u['logged_calories']:.0f} ккал\n"
+    response += f"Сожжено: {u['burned_calories']:.0f} ккал\n"
+    response += f"Баланс: {net_calories:.0f} ккал из {u['calorie_goal']} ккал\n"
+    
+    if net_calories > u['calorie_goal']:
+        response += "⚠️ Превышение нормы калорий!"
+    elif net_calories >= u['calorie_goal'] * 0.9:
+        response += "✅ Норма почти выполнена!"
+    
+    return response
+
+
+def render_dashboard(user_id: int) -> tuple:
+    """Текст и кнопки закреплённого сообщения с прогрессом (режим /live)"""
+    response = format_daily_progress(user_id)
+    rec_text = format_recommendations(user_id)
+    if rec_text:
+        response += f"\n\n💡 Рекомендации:{rec_text}"
+    return response, get_recommendation_buttons(user_id)
+
+
+dashboard = LiveDashboard(render_dashboard)
+
+
+def refresh_dashboard(message: Message, user_id: int) -> bool:
+    """В режиме /live вместо отдельного ответа планирует обновление закреплённого сообщения.
+
+    Возвращает False, если режим выключен и ответить нужно как обычно.
+    """
+    user = users[user_id]
+    if not user['live_dashboard']:
+        return False
+    dashboard.request_update(message.bot, user_id, message.chat.id, user['day'].toordinal())
+    return True
+
+
+# Ответ на нажатие кнопки, данные которой больше не действительны (каталог обновлён, ввод начат заново)
+STALE_BUTTON_TEXT = "⚠️ Кнопка устарела, вызовите команду заново"
+
+
 def get_recommendation_buttons(user_id: int) -> InlineKeyboardMarkup | None:
     """Создаёт кнопки для быстрого логирования рекомендованных действий"""
     user = users.get(user_id)
@@ -327,9 +502,10 @@ def get_recommendation_buttons(user_id: int) -> InlineKeyboardMarkup | None:
             buttons.append([
                 InlineKeyboardButton(
                     text=f"🍌 Съесть {food['name']} ({total_grams}г)",
-                    callback_data=f"quick_log_food:{food['name']}:{total_grams}"
+                    callback_data=QuickFoodCallback(food_id=food['id'], grams=total_grams).pack()
                 )
             ])
+            analytics.recommendation_shown('food')
     
     if surplus > user['calorie_goal'] * 0.2:
         recs = get_workout_recommendations(user_id)
@@ -340,9 +516,10 @@ def get_recommendation_buttons(user_id: int) -> InlineKeyboardMarkup | None:
             buttons.append([
                 InlineKeyboardButton(
                     text=f"🚶 Погулять {minutes} мин",
-                    callback_data=f"quick_log_workout:{w['name']}:{minutes}"
+                    callback_data=QuickWorkoutCallback(workout_id=w['id'], minutes=minutes).pack()
                 )
             ])
+            analytics.recommendation_shown('workout')
     
     if buttons:
         buttons.append([
@@ -353,57 +530,66 @@ def get_recommendation_buttons(user_id: int) -> InlineKeyboardMarkup | None:
     return None
 
 
-@router.callback_query(lambda c: c.data.startswith("quick_log_food:"))
-async def quick_log_food(callback: CallbackQuery, state: FSMContext):
-    _, product, grams = callback.data.split(":")
+async def quick_log_food(callback: CallbackQuery, state: FSMContext, callback_data: QuickFoodCallback):
     user_id = callback.from_user.id
     
     ensure_user_exists(user_id)
-    reset_daily_data(user_id)
     
-    food = search_food(product)
-    if food:
-        calories = food['calories'] * float(grams) / 100
-        users[user_id]['logged_calories'] += calories
-        save_daily_stats(user_id)
-        
-        await callback.answer()
-        await callback.message.edit_text(
-            f"✅ Быстро записано: {grams}г {food['name']} — {calories:.1f} ккал\n"
-            f"Всего сегодня: {users[user_id]['logged_calories']:.1f} ккал"
-        )
-    else:
-        await callback.answer("❌ Продукт не найден", show_alert=True)
+    food = catalogs.current.low_cal_foods_by_id.get(callback_data.food_id)
+    if food is None:
+        await callback.answer(STALE_BUTTON_TEXT, show_alert=True)
+        return
+    grams = callback_data.grams
+    calories = food['calories'] * grams / 100
+    users[user_id]['logged_calories'] += calories
+    save_daily_stats(user_id)
+    analytics.log_food(calories)
+    analytics.recommendation_clicked('food')
+    
+    if refresh_dashboard(callback.message, user_id):
+        await callback.answer(f"✅ Записано: {grams}г {food['name']} — {calories:.1f} ккал")
+        return
+    
+    await callback.answer()
+    await callback.message.edit_text(
+        f"✅ Быстро записано: {grams}г {food['name']} — {calories:.1f} ккал\n"
+        f"Всего сегодня: {users[user_id]['logged_calories']:.1f} ккал"
+    )
 
 
-@router.callback_query(lambda c: c.data.startswith("quick_log_workout:"))
-async def quick_log_workout(callback: CallbackQuery, state: FSMContext):
-    _, workout_type, minutes = callback.data.split(":")
+async def quick_log_workout(callback: CallbackQuery, state: FSMContext, callback_data: QuickWorkoutCallback):
     user_id = callback.from_user.id
     
     ensure_user_exists(user_id)
-    reset_daily_data(user_id)
     
     # Логируем тренировку
-    cal_per_min = WORKOUT_CALORIES.get(workout_type.lower(), 4)
-    burned = int(cal_per_min * int(minutes))
+    workout = catalogs.current.burn_workouts_by_id.get(callback_data.workout_id)
+    if workout is None:
+        await callback.answer(STALE_BUTTON_TEXT, show_alert=True)
+        return
+    minutes = callback_data.minutes
+    burned = int(workout['cal_per_min'] * minutes)
     users[user_id]['burned_calories'] += burned
     save_daily_stats(user_id)
+    analytics.log_workout(burned)
+    analytics.recommendation_clicked('workout')
+    
+    if refresh_dashboard(callback.message, user_id):
+        await callback.answer(f"✅ Записано: {workout['name'].capitalize()} {minutes} мин — {burned} ккал")
+        return
     
     await callback.answer()
     await callback.message.edit_text(
-        f"✅ Быстро записано: {workout_type.capitalize()} {minutes} мин — {burned} ккал сожжено"
+        f"✅ Быстро записано: {workout['name'].capitalize()} {minutes} мин — {burned} ккал сожжено"
     )
 
 
-@router.callback_query(lambda c: c.data == "show_progress")
-async def show_progress_from_callback(callback: CallbackQuery):
+async def show_progress_from_callback(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     await check_progress(callback.message)
 
 
-@router.callback_query(lambda c: c.data == "close_recommendations")
-async def close_recommendations(callback: CallbackQuery):
+async def close_recommendations(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     await callback.message.delete()
 
@@ -416,78 +602,157 @@ def get_cancel_help_buttons() -> InlineKeyboardMarkup:
     ])
 
 
-FOOD_FALLBACK = {
-    "банан": 89, "яблоко": 52, "апельсин": 47, "хлеб": 265, "рис": 130,
-    "курица": 165, "говядина": 250, "рыба": 205, "яйцо": 155, "молоко": 42,
-    "кефир": 40, "творог": 120, "картошка": 77, "макароны": 158,
-    "шоколад": 546, "вода": 0, "кофе": 2, "чай": 1, "кола": 42, "пиво": 43
-}
-
-WORKOUT_CALORIES = {
-    "бег": 10, "ходьба": 4, "велосипед": 8, "плавание": 9, "йога": 5,
-    "силовая": 8, "танцы": 6, "футбол": 10, "баскетбол": 9, "теннис": 8
-}
-
-
-def get_food_info(product_name: str) -> Optional[Dict[str, Any]]:
+# Пределы одной записи воды и тренировки — как 1–5000 г для еды
+MAX_WATER_ML = 5000
+MAX_WORKOUT_MINUTES = 600
+# Стандартные кнопки быстрой записи; к ним добавляются частые записи пользователя
+PRESET_WATER_AMOUNTS = (250, 500)
+PRESET_WORKOUTS = (("бег", 30),)
+FREQUENT_PRESETS = 2
+# Сколько разных записей помнится для подсчёта частых
+FREQUENT_TRACKED = 16
+
+
+def remember_entry(user_id: int, key):
+    """Учитывает запись (объём воды в мл или пару (тренировка, минуты)) для кнопок частых записей"""
+    user = users[user_id]
+    if user.entry_counts is None:
+        user.entry_counts = {}
+    counts = user.entry_counts
+    counts[key] = counts.get(key, 0) + 1
+    if len(counts) > FREQUENT_TRACKED:
+        # Вытесняется самая редкая из прежних записей, чтобы новая привычка успела набрать счёт
+        del counts[min((k for k in counts if k != key), key=counts.get)]
+
+
+def frequent_entries(user_id: int, kind: type) -> list:
+    """Самые частые записи пользователя одного вида (int — вода, tuple — тренировки)"""
+    counts = users[user_id].entry_counts or {}
+    entries = [k for k in counts if isinstance(k, kind)]
+    entries.sort(key=counts.get, reverse=True)
+    return entries
+
+
+def get_water_preset_buttons(user_id: int) -> InlineKeyboardMarkup:
+    amounts = list(PRESET_WATER_AMOUNTS)
+    for ml in frequent_entries(user_id, int):
+        if len(amounts) >= len(PRESET_WATER_AMOUNTS) + FREQUENT_PRESETS:
+            break
+        if ml not in amounts:
+            amounts.append(ml)
+    row = [
+        InlineKeyboardButton(text=f"💧 {ml} мл", callback_data=WaterPresetCallback(ml=ml).pack())
+        for ml in amounts
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=[row] + get_cancel_help_buttons().inline_keyboard)
+
+
+def get_workout_preset_buttons(user_id: int) -> InlineKeyboardMarkup:
+    presets = list(PRESET_WORKOUTS)
+    for entry in frequent_entries(user_id, tuple):
+        if len(presets) >= len(PRESET_WORKOUTS) + FREQUENT_PRESETS:
+            break
+        if entry not in presets and entry[0] in catalogs.current.workout_calories:
+            presets.append(entry)
+    rows = [
+        [InlineKeyboardButton(
+            text=f"💪 {workout.capitalize()} {minutes} мин",
+            callback_data=WorkoutPresetCallback(workout=workout, minutes=minutes).pack()
+        )]
+        for workout, minutes in presets
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=rows + get_cancel_help_buttons().inline_keyboard)
+
+
+async def get_food_by_barcode(code: str) -> Optional[Dict[str, Any]]:
+    """Запрашивает в OpenFoodFacts один продукт по штрихкоду; ответ (и его отсутствие) кэшируется"""
+    cached, food = barcode_cache.get(code)
+    if cached:
+        return food
     try:
-        encoded_name = urllib.parse.quote(product_name.strip())
-        url = (
-            f"https://world.openfoodfacts.org/cgi/search.pl?"
-            f"action=process&"
-            f"search_terms={encoded_name}&"
-            f"json=1&"
-            f"page_size=3"
+        status, data = await food_upstream.get_json(
+            f"https://world.openfoodfacts.org/api/v2/product/{code}.json",
+            params={'fields': 'code,product_name,product_name_ru,nutriments,serving_size'}
         )
-        response = requests.get(url, timeout=8)
-        if response.status_code != 200:
-            return None
-        
-        data = response.json()
-        products = data.get('products', [])
-        
-        for product in products:
-            # Получаем название на русском или английском
-            name = (
-                product.get('product_name_ru') or 
-                product.get('product_name') or 
-                'Неизвестный продукт'
-            ).strip()
-            
-            nutriments = product.get('nutriments', {})
-            calories = (
-                nutriments.get('energy-kcal_100g') or
-                nutriments.get('energy_100g', 0) / 4.184 or 
-                0
-            )
-            
-            if calories > 0 and name and name.lower() != 'unknown':
-                serving_size = product.get('serving_size', '100г')
-                
-                return {
-                    'name': name.capitalize(),
-                    'calories': round(float(calories), 1),
-                    'serving_size': serving_size
-                }
-        
+    except UpstreamError:
+        return None
+    if status == 404 or (status == 200 and isinstance(data, dict) and not data.get('product')):
+        barcode_cache.put(code, None)
         return None
-    except Exception:
+    if status != 200 or not isinstance(data, dict):
         return None
+    
+    food = parse_product(data['product'])
+    if food:
+        food = {
+            'name': food['name'],
+            'calories': food['calories'],
+            'serving_size': food['serving_size']
+        }
+    barcode_cache.put(code, food)
+    return food
 
 
-def search_food(product_name: str) -> Optional[Dict[str, Any]]:
-    result = get_food_info(product_name)
+async def search_barcode(code: str, offline: bool = False) -> Optional[Dict[str, Any]]:
+    """Ищет продукт по штрихкоду в локальном индексе, затем в OpenFoodFacts (если не offline)"""
+    index = get_food_index()
+    if index:
+        result = index.lookup_barcode(code)
+        if result:
+            return result
+    if offline:
+        cached, food = barcode_cache.get(code)
+        return food
+    return await get_food_by_barcode(code)
+
+
+def find_in_index(product_name: str) -> Optional[Dict[str, Any]]:
+    index = get_food_index()
+    return index.search(product_name) if index else None
+
+
+def find_food_offline(product_name: str) -> Optional[Dict[str, Any]]:
+    """Ищет продукт без запросов к OpenFoodFacts: в локальном индексе, в уже загруженной
+    первой странице поиска, затем во встроенном каталоге"""
+    result = find_in_index(product_name)
     if result:
         return result
     
+    page = food_pages.cached(product_name, 1)
+    if page is not None and page.foods:
+        return page.foods[0]
+    
+    return find_in_catalog(product_name)
+
+
+async def search_food_candidates(product_name: str) -> Tuple[Optional[Dict[str, Any]], Optional[SearchPage]]:
+    """Ищет продукт в локальном индексе, затем в OpenFoodFacts, затем во встроенном каталоге;
+    неоднозначный ответ OpenFoodFacts возвращается целиком для выбора.
+
+    Возвращает (продукт, None), если результат один, или (None, первая страница кандидатов).
+    """
+    result = find_in_index(product_name)
+    if result:
+        return result, None
+    
+    page = await food_pages.get(product_name)
+    if page is not None and (len(page.foods) > 1 or page.has_more):
+        return None, page
+    if page is not None and page.foods:
+        return page.foods[0], None
+    return find_in_catalog(product_name), None
+
+
+def find_in_catalog(product_name: str) -> Optional[Dict[str, Any]]:
+    food_fallback = catalogs.current.food_fallback
     product_lower = product_name.strip().lower()
-    if product_lower in FOOD_FALLBACK:
+    if product_lower in food_fallback:
         return {
             'name': product_lower.capitalize(),
-            'calories': FOOD_FALLBACK[product_lower]
+            'calories': food_fallback[product_lower]
         }
     
-    for key, calories in FOOD_FALLBACK.items():
+    for key, calories in food_fallback.items():
         if product_lower in key or key in product_lower:
             return {
                 'name': key.capitalize(),
@@ -497,18 +762,8 @@ def search_food(product_name: str) -> Optional[Dict[str, Any]]:
 
 
 async def get_weather(city: str) -> Dict[str, Any]:
-    try:
-        encoded_city = urllib.parse.quote(city)
-        url = f"http://api.openweathermap.org/data/2.5/weather?q={encoded_city}&appid={OPENWEATHER_API_KEY}&units=metric"
-        loop = asyncio.get_running_loop()
-        response = await loop.run_in_executor(None, lambda: requests.get(url, timeout=8))
-        
-        if response.status_code == 200:
-            data = response.json()
-            return {'success': True, 'temp': data['main']['temp']}
-        return {'success': False, 'error': f"Город '{city}' не найден"}
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
+    """Погода в городе; ответы общие для всех ботов процесса (см. services.weather_cache)"""
+    return await weather_cache.get(city)
 
 
 def calculate_water_goal(weight: float, activity: int, temp: float) -> int:
@@ -521,7 +776,62 @@ def calculate_calorie_goal(weight: float, height: float, age: int, gender: str,
     return int(bmr * factor)
 
 
-@router.callback_query(lambda c: c.data == "cancel_operation")
+# Сколько запросов погоды выполняется одновременно при обновлении норм воды
+WEATHER_REFRESH_CONCURRENCY = 8
+
+
+async def refresh_water_goals() -> Tuple[int, int]:
+    """Пересчитывает нормы воды по текущей погоде: один запрос на город, а не на пользователя
+    (и не на бота — погода берётся из общего кэша).
+
+    Возвращает число городов, для которых получена погода, и число обновлённых пользователей.
+    """
+    by_city: Dict[str, List[int]] = {}
+    for user_id in list(users):
+        if is_profile_complete(user_id):
+            by_city.setdefault(city_key(users[user_id]['city']), []).append(user_id)
+    if not by_city:
+        return 0, 0
+    
+    semaphore = asyncio.Semaphore(WEATHER_REFRESH_CONCURRENCY)
+    
+    async def fetch(user_ids: List[int]) -> Dict[str, Any]:
+        async with semaphore:
+            return await get_weather(users[user_ids[0]]['city'])
+    
+    weathers = await asyncio.gather(*(fetch(user_ids) for user_ids in by_city.values()))
+    cities = updated = 0
+    for (key, user_ids), weather in zip(by_city.items(), weathers):
+        if not weather['success']:
+            continue
+        cities += 1
+        temperature = weather['temp']
+        offset = weather['utc_offset']
+        for user_id in user_ids:
+            user = users[user_id]
+            # Пока шли запросы, пользователь мог сменить город
+            if not is_profile_complete(user_id) or city_key(user['city']) != key:
+                continue
+            user['water_goal'] = calculate_water_goal(user['weight'], user['activity'], temperature)
+            # Заодно учитываем переход города на летнее или зимнее время
+            if offset is not None and int(offset) != user['utc_offset']:
+                set_user_utc_offset(user_id, int(offset))
+            updated += 1
+    return cities, updated
+
+
+async def run_water_goal_refresh():
+    """Каждый день в WATER_GOAL_REFRESH_HOUR обновляет нормы воды по погоде в городах пользователей"""
+    while True:
+        fire_at = next_local_time_ts(DEFAULT_UTC_OFFSET, WATER_GOAL_REFRESH_HOUR * 3600)
+        await asyncio.sleep(fire_at - time.time())
+        try:
+            cities, updated = await refresh_water_goals()
+            print(f"💧 Нормы воды обновлены по погоде: городов {cities}, пользователей {updated}")
+        except Exception as e:
+            print(f"Ошибка обновления норм воды: {e}")
+
+
 async def callback_cancel(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await callback.answer("❌ Операция отменена")
@@ -531,8 +841,7 @@ async def callback_cancel(callback: CallbackQuery, state: FSMContext):
         await callback.message.answer("❌ Операция отменена.")
 
 
-@router.callback_query(lambda c: c.data == "show_help")
-async def callback_help(callback: CallbackQuery):
+async def callback_help(callback: CallbackQuery, state: FSMContext):
     help_text = (
         "📖 Справка:\n\n"
         "• /set_profile — настроить профиль\n"
@@ -551,12 +860,52 @@ async def callback_help(callback: CallbackQuery):
         await callback.message.answer(help_text, reply_markup=get_cancel_help_buttons())
 
 
-@router.callback_query(lambda c: c.data == "set_profile")
 async def callback_set_profile(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     await start_profile_form(callback.message, state)
 
 
+INLINE_RESULTS_LIMIT = 10
+# Сколько секунд клиент Telegram может кэшировать ответ на inline-запрос
+INLINE_CACHE_TIME = 300
+# Короткая пауза перед поиском: если пользователь продолжает печатать, старый запрос отменяется
+INLINE_DEBOUNCE = 0.03
+inline_tasks: Dict[int, asyncio.Task] = {}
+
+
+@router.inline_query()
+async def inline_food_search(inline_query: InlineQuery):
+    user_id = inline_query.from_user.id
+    task = asyncio.current_task()
+    previous = inline_tasks.get(user_id)
+    if previous is not None and not previous.done():
+        previous.cancel()
+    inline_tasks[user_id] = task
+    
+    try:
+        await asyncio.sleep(INLINE_DEBOUNCE)
+        foods = suggester.suggest(inline_query.query, INLINE_RESULTS_LIMIT)
+        results = [
+            InlineQueryResultArticle(
+                id=str(i),
+                title=food['name'],
+                description=f"{food['calories']} ккал на 100 г",
+                input_message_content=InputTextMessageContent(
+                    message_text=f"🍎 {food['name']} — {food['calories']} ккал на 100 г"
+                )
+            )
+            for i, food in enumerate(foods)
+        ]
+        await inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
+    except asyncio.CancelledError:
+        # Запрос устарел: пользователь уже ввёл новый текст
+        if inline_tasks.get(user_id) is task:
+            raise
+    finally:
+        if inline_tasks.get(user_id) is task:
+            del inline_tasks[user_id]
+
+
 @router.message(Command("start"))
 async def start(message: Message, state: FSMContext):
     await state.clear()
@@ -709,6 +1058,9 @@ async def process_city(message: Message, state: FSMContext):
         data['weight'], data['height'], data['age'], data['gender'], data['activity']
     )
     
+    if weather['success'] and weather['utc_offset'] is not None:
+        set_user_utc_offset(user_id, int(weather['utc_offset']))
+    
     users[user_id].update({
         'weight': data['weight'],
         'height': data['height'],
@@ -741,7 +1093,6 @@ async def process_city(message: Message, state: FSMContext):
 @router.message(Command("log_water"))
 async def start_log_water(message: Message, state: FSMContext):
     ensure_user_exists(message.from_user.id)
-    reset_daily_data(message.from_user.id)
     
     if not is_profile_complete(message.from_user.id):
         await message.answer(
@@ -754,8 +1105,8 @@ async def start_log_water(message: Message, state: FSMContext):
     
     await state.set_state(WaterForm.amount)
     await message.answer(
-        "💧 Сколько миллилитров воды вы выпили?",
-        reply_markup=get_cancel_help_buttons()
+        "💧 Сколько миллилитров воды вы выпили? Нажмите кнопку или введите число:",
+        reply_markup=get_water_preset_buttons(message.from_user.id)
     )
 
 
@@ -764,41 +1115,66 @@ async def process_water_amount(message: Message, state: FSMContext):
     ensure_user_exists(message.from_user.id)
     try:
         ml = int(message.text)
-        if ml <= 0:
+        if not 1 <= ml <= MAX_WATER_ML:
             raise ValueError
-        
-        user_id = message.from_user.id
-        users[user_id]['logged_water'] += ml
-        remaining = users[user_id]['water_goal'] - users[user_id]['logged_water']
-        
-        save_daily_stats(user_id)
-        await state.clear()
-        
-        response = f"✅ Записано {ml} мл воды.\n"
-        if remaining <= 0:
-            response += f"🎯 Норма воды выполнена! (+{abs(remaining)} мл сверх нормы)"
-        else:
-            response += f"💧 Осталось выпить: {remaining} мл из {users[user_id]['water_goal']} мл"
-        
-        # Добавляем рекомендации по калориям после логирования воды
-        rec_text = format_recommendations(user_id)
-        if rec_text:
-            response += f"\n\n{rec_text}"
-            await message.answer(response, parse_mode="HTML", reply_markup=get_recommendation_buttons(user_id))
-        else:
-            await message.answer(response)
-    
-    except (ValueError, AttributeError):
+    except (ValueError, TypeError):
         await message.answer(
-            "❌ Введите корректное количество в мл (целое число, например: 300):",
-            reply_markup=get_cancel_help_buttons()
+            f"❌ Введите корректное количество в мл (целое число от 1 до {MAX_WATER_ML}, например: 300):",
+            reply_markup=get_water_preset_buttons(message.from_user.id)
         )
+        return
+    
+    await state.clear()
+    await record_water(message, message.from_user.id, ml)
+
+
+async def water_preset(callback: CallbackQuery, state: FSMContext, callback_data: WaterPresetCallback):
+    user_id = callback.from_user.id
+    ensure_user_exists(user_id)
+    await state.clear()
+    await callback.answer()
+    await record_water(callback.message, user_id, callback_data.ml, edit=True)
+
+
+async def record_water(message: Message, user_id: int, ml: int, edit: bool = False):
+    """Записывает воду и отвечает; edit=True — ответ заменяет сообщение с кнопками выбора"""
+    users[user_id]['logged_water'] += ml
+    remember_entry(user_id, ml)
+    analytics.log_water(ml)
+    remaining = users[user_id]['water_goal'] - users[user_id]['logged_water']
+    
+    milestone = save_daily_stats(user_id)
+    
+    if refresh_dashboard(message, user_id):
+        if edit:
+            await message.edit_text(f"✅ Записано {ml} мл воды.")
+        if milestone:
+            await message.answer(f"🏆 Достижение: норма воды {milestone} дн. подряд!")
+        return
+    
+    response = f"✅ Записано {ml} мл воды.\n"
+    if remaining <= 0:
+        response += f"🎯 Норма воды выполнена! (+{abs(remaining)} мл сверх нормы)"
+        if users[user_id].water_streak > 1:
+            response += f"\n🔥 Серия: {users[user_id].water_streak} дн. подряд"
+    else:
+        response += f"💧 Осталось выпить: {remaining} мл из {users[user_id]['water_goal']} мл"
+    if milestone:
+        response += f"\n🏆 Достижение: норма воды {milestone} дн. подряд!"
+    
+    # Добавляем рекомендации по калориям после логирования воды
+    reply = message.edit_text if edit else message.answer
+    rec_text = format_recommendations(user_id)
+    if rec_text:
+        response += f"\n\n{rec_text}"
+        await reply(response, parse_mode="HTML", reply_markup=get_recommendation_buttons(user_id))
+    else:
+        await reply(response)
 
 
 @router.message(Command("log_food"))
 async def start_log_food(message: Message, state: FSMContext):
     ensure_user_exists(message.from_user.id)
-    reset_daily_data(message.from_user.id)
     
     if not is_profile_complete(message.from_user.id):
         await message.answer(
@@ -811,7 +1187,7 @@ async def start_log_food(message: Message, state: FSMContext):
     
     await state.set_state(FoodForm.product)
     await message.answer(
-        "🍎 Какой продукт вы съели?",
+        "🍎 Какой продукт вы съели? Введите название или штрихкод с упаковки.",
         reply_markup=get_cancel_help_buttons()
     )
 
@@ -828,12 +1204,47 @@ async def process_food_product(message: Message, state: FSMContext, bot: Bot):
         )
         return
     
+    barcode = normalize_barcode(product)
+    digits = product.replace(' ', '').replace('-', '')
+    if barcode is None and digits.isdigit() and len(digits) >= 8:
+        await message.answer(
+            "❌ Штрихкод введён с ошибкой. Проверьте цифры под полосками или введите название продукта:",
+            reply_markup=get_cancel_help_buttons()
+        )
+        return
+    
     await bot.send_chat_action(chat_id=message.chat.id, action="typing")
     
-    food = search_food(product)
+    if admission.overloaded('food_lookup'):
+        # Бот перегружен — ищем только локально, без запроса к OpenFoodFacts
+        food = await search_barcode(barcode, offline=True) if barcode else find_food_offline(product)
+        if not food:
+            await message.answer(
+                "⏳ Сейчас бот перегружен и не может найти этот продукт.\n"
+                "Попробуйте через минуту или введите более простое название (например, 'банан'):",
+                reply_markup=get_cancel_help_buttons()
+            )
+            return
+    else:
+        with admission.track('food_lookup'):
+            if barcode:
+                food = await search_barcode(barcode)
+            else:
+                food, page = await search_food_candidates(product)
+                if page is not None:
+                    await show_food_candidates(message, state, product, 1, page)
+                    return
+    
+    if not food and barcode:
+        await message.answer(
+            f"❌ Продукт со штрихкодом {barcode} не найден.\n\n"
+            "Введите название продукта:",
+            reply_markup=get_cancel_help_buttons()
+        )
+        return
     
     if not food:
-        suggestions = [p for p in FOOD_FALLBACK if product.lower() in p or p in product.lower()][:3]
+        suggestions = [p for p in catalogs.current.food_fallback if product.lower() in p or p in product.lower()][:3]
         if suggestions:
             await message.answer(
                 f"❌ Продукт '{product}' не найден.\n"
@@ -849,9 +1260,16 @@ async def process_food_product(message: Message, state: FSMContext, bot: Bot):
             )
         return
     
-    await state.update_data(pending_food=food)
+    await ask_food_grams(message, state, food)
+
+
+async def ask_food_grams(message: Message, state: FSMContext, food: Dict[str, Any], edit: bool = False):
+    """Запоминает выбранный продукт и спрашивает количество; edit=True — вместо сообщения с выбором"""
+    suggester.remember(food)
+    await state.update_data(pending_food=food, food_candidates=None)
     await state.set_state(FoodForm.grams)
-    await message.answer(
+    reply = message.edit_text if edit else message.answer
+    await reply(
         f"✅ Найден продукт: {food['name']}\n"
         f"Калорийность: {food['calories']} ккал на 100г\n"
         f"Сколько грамм вы съели?",
@@ -859,6 +1277,70 @@ async def process_food_product(message: Message, state: FSMContext, bot: Bot):
     )
 
 
+async def show_food_candidates(message: Message, state: FSMContext, query: str, page_number: int,
+                               page: SearchPage, edit: bool = False):
+    """Показывает страницу кандидатов кнопками и заранее загружает следующую.
+
+    Кандидаты страницы сохраняются в состоянии, поэтому выбор не обращается ни к кэшу, ни к OpenFoodFacts.
+    """
+    await state.update_data(food_query=query, food_page=page_number, food_candidates=list(page.foods))
+    rows = [
+        [InlineKeyboardButton(
+            text=f"{food['name'][:40]} — {food['calories']:g} ккал/100г",
+            callback_data=FoodPickCallback(page=page_number, index=i).pack()
+        )]
+        for i, food in enumerate(page.foods)
+    ]
+    navigation = []
+    if page_number > 1:
+        navigation.append(InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=FoodPageCallback(page=page_number - 1).pack()
+        ))
+    if page.has_more:
+        navigation.append(InlineKeyboardButton(
+            text="Ещё ➡️", callback_data=FoodPageCallback(page=page_number + 1).pack()
+        ))
+        food_pages.prefetch(query, page_number + 1)
+    if navigation:
+        rows.append(navigation)
+    
+    text = (
+        f"🔎 По запросу «{query}» найдено несколько продуктов (страница {page_number}).\n"
+        "Выберите подходящий или введите название точнее:"
+    )
+    markup = InlineKeyboardMarkup(inline_keyboard=rows + get_cancel_help_buttons().inline_keyboard)
+    if edit:
+        await message.edit_text(text, reply_markup=markup)
+    else:
+        await message.answer(text, reply_markup=markup)
+
+
+async def food_candidate_pick(callback: CallbackQuery, state: FSMContext, callback_data: FoodPickCallback):
+    data = await state.get_data()
+    candidates = data.get('food_candidates')
+    if (await state.get_state() != FoodForm.product.state or not candidates
+            or data.get('food_page') != callback_data.page or not 0 <= callback_data.index < len(candidates)):
+        await callback.answer(STALE_BUTTON_TEXT, show_alert=True)
+        return
+    await callback.answer()
+    await ask_food_grams(callback.message, state, candidates[callback_data.index], edit=True)
+
+
+async def food_candidate_page(callback: CallbackQuery, state: FSMContext, callback_data: FoodPageCallback):
+    data = await state.get_data()
+    query = data.get('food_query')
+    if await state.get_state() != FoodForm.product.state or not query:
+        await callback.answer(STALE_BUTTON_TEXT, show_alert=True)
+        return
+    # Обычно страница уже в кэше благодаря предзагрузке
+    page = await food_pages.get(query, callback_data.page)
+    if page is None:
+        await callback.answer("⏳ Не удалось загрузить страницу, попробуйте ещё раз", show_alert=True)
+        return
+    await callback.answer()
+    await show_food_candidates(callback.message, state, query, callback_data.page, page, edit=True)
+
+
 @router.message(FoodForm.grams)
 async def process_food_grams(message: Message, state: FSMContext):
     ensure_user_exists(message.from_user.id)
@@ -878,10 +1360,14 @@ async def process_food_grams(message: Message, state: FSMContext):
         calories = food['calories'] * grams / 100
         user_id = message.from_user.id
         users[user_id]['logged_calories'] += calories
+        analytics.log_food(calories)
         
         save_daily_stats(user_id)
         await state.clear()
         
+        if refresh_dashboard(message, user_id):
+            return
+        
         response = f"✅ Записано: {grams:.0f}г {food['name']} — {calories:.1f} ккал\n"
         response += f"Всего сегодня: {users[user_id]['logged_calories']:.1f} ккал"
         
@@ -903,7 +1389,6 @@ async def process_food_grams(message: Message, state: FSMContext):
 @router.message(Command("log_workout"))
 async def start_log_workout(message: Message, state: FSMContext):
     ensure_user_exists(message.from_user.id)
-    reset_daily_data(message.from_user.id)
     
     if not is_profile_complete(message.from_user.id):
         await message.answer(
@@ -916,9 +1401,9 @@ async def start_log_workout(message: Message, state: FSMContext):
     
     await state.set_state(WorkoutForm.type)
     await message.answer(
-        "💪 Какой тип тренировки вы выполнили?\n"
-        f"Доступные типы: {', '.join(WORKOUT_CALORIES.keys())}",
-        reply_markup=get_cancel_help_buttons()
+        "💪 Какой тип тренировки вы выполнили? Нажмите кнопку, чтобы записать сразу, или введите тип.\n"
+        f"Доступные типы: {catalogs.current.workout_types}",
+        reply_markup=get_workout_preset_buttons(message.from_user.id)
     )
 
 
@@ -926,15 +1411,16 @@ async def start_log_workout(message: Message, state: FSMContext):
 async def process_workout_type(message: Message, state: FSMContext):
     ensure_user_exists(message.from_user.id)
     workout_type = message.text.strip().lower()
+    catalog = catalogs.current
     
     matched_type = None
-    for key in WORKOUT_CALORIES.keys():
+    for key in catalog.workout_calories:
         if workout_type == key or workout_type in key or key in workout_type:
             matched_type = key
             break
     
     if not matched_type:
-        suggestions = [t for t in WORKOUT_CALORIES.keys() if workout_type in t or t in workout_type][:3]
+        suggestions = [t for t in catalog.workout_calories if workout_type in t or t in workout_type][:3]
         if suggestions:
             await message.answer(
                 f"❌ Тип '{workout_type}' не найден.\n"
@@ -945,7 +1431,7 @@ async def process_workout_type(message: Message, state: FSMContext):
         else:
             await message.answer(
                 f"❌ Неизвестный тип тренировки.\n"
-                f"Доступные типы: {', '.join(WORKOUT_CALORIES.keys())}\n\n"
+                f"Доступные типы: {catalog.workout_types}\n\n"
                 "Введите тип тренировки:",
                 reply_markup=get_cancel_help_buttons()
             )
@@ -964,49 +1450,75 @@ async def process_workout_duration(message: Message, state: FSMContext):
     ensure_user_exists(message.from_user.id)
     data = await state.get_data()
     workout_type = data.get('workout_type')
+    # Тип мог пропасть из каталога, если его перезагрузили во время ввода
+    cal_per_min = catalogs.current.workout_calories.get(workout_type)
     
-    if not workout_type:
+    if cal_per_min is None:
         await state.clear()
         await message.answer("❌ Ошибка. Начните заново: /log_workout")
         return
     
     try:
         duration = int(message.text)
-        if duration <= 0:
+        if not 1 <= duration <= MAX_WORKOUT_MINUTES:
             raise ValueError
-        
-        cal_per_min = WORKOUT_CALORIES[workout_type]
-        burned = int(cal_per_min * duration)
-        water_needed = (duration // 30) * 200
-        
-        user_id = message.from_user.id
-        users[user_id]['burned_calories'] += burned
-        
-        save_daily_stats(user_id)
-        await state.clear()
-        
-        response = (
-            f"💪 Тренировка записана:\n"
-            f"Тип: {workout_type.capitalize()}\n"
-            f"Длительность: {duration} мин\n"
-            f"Сожжено: {burned} ккал"
-        )
-        if water_needed > 0:
-            response += f"\n💧 Рекомендуется доп. выпить: {water_needed} мл воды"
-        
-        # Добавляем рекомендации после логирования тренировки
-        rec_text = format_recommendations(user_id)
-        if rec_text:
-            response += f"\n\n{rec_text}"
-            await message.answer(response, parse_mode="HTML", reply_markup=get_recommendation_buttons(user_id))
-        else:
-            await message.answer(response)
-    
-    except (ValueError, AttributeError):
+    except (ValueError, TypeError):
         await message.answer(
-            "❌ Введите корректную длительность в минутах (целое число, например: 30):",
+            f"❌ Введите корректную длительность в минутах (целое число от 1 до {MAX_WORKOUT_MINUTES}, например: 30):",
             reply_markup=get_cancel_help_buttons()
         )
+        return
+    
+    await state.clear()
+    await record_workout(message, message.from_user.id, workout_type, cal_per_min, duration)
+
+
+async def workout_preset(callback: CallbackQuery, state: FSMContext, callback_data: WorkoutPresetCallback):
+    user_id = callback.from_user.id
+    ensure_user_exists(user_id)
+    cal_per_min = catalogs.current.workout_calories.get(callback_data.workout)
+    if cal_per_min is None:
+        await callback.answer(STALE_BUTTON_TEXT, show_alert=True)
+        return
+    await state.clear()
+    await callback.answer()
+    await record_workout(callback.message, user_id, callback_data.workout, cal_per_min, callback_data.minutes, edit=True)
+
+
+async def record_workout(message: Message, user_id: int, workout_type: str, cal_per_min: float, duration: int,
+                         edit: bool = False):
+    """Записывает тренировку и отвечает; edit=True — ответ заменяет сообщение с кнопками выбора"""
+    burned = int(cal_per_min * duration)
+    water_needed = (duration // 30) * 200
+    
+    users[user_id]['burned_calories'] += burned
+    remember_entry(user_id, (workout_type, duration))
+    analytics.log_workout(burned)
+    
+    save_daily_stats(user_id)
+    
+    if refresh_dashboard(message, user_id):
+        if edit:
+            await message.edit_text(f"💪 Записано: {workout_type.capitalize()} {duration} мин — {burned} ккал")
+        return
+    
+    response = (
+        f"💪 Тренировка записана:\n"
+        f"Тип: {workout_type.capitalize()}\n"
+        f"Длительность: {duration} мин\n"
+        f"Сожжено: {burned} ккал"
+    )
+    if water_needed > 0:
+        response += f"\n💧 Рекомендуется доп. выпить: {water_needed} мл воды"
+    
+    # Добавляем рекомендации после логирования тренировки
+    reply = message.edit_text if edit else message.answer
+    rec_text = format_recommendations(user_id)
+    if rec_text:
+        response += f"\n\n{rec_text}"
+        await reply(response, parse_mode="HTML", reply_markup=get_recommendation_buttons(user_id))
+    else:
+        await reply(response)
 
 
 @router.message(Command("view_profile"))
@@ -1040,7 +1552,6 @@ async def view_profile(message: Message):
 @router.message(Command("check_progress"))
 async def check_progress(message: Message):
     ensure_user_exists(message.from_user.id)
-    reset_daily_data(message.from_user.id)
     
     if not is_profile_complete(message.from_user.id):
         await message.answer(
@@ -1051,34 +1562,7 @@ async def check_progress(message: Message):
         )
         return
     
-    u = users[message.from_user.id]
-    net_calories = u['logged_calories'] - u['burned_calories']
-    
-    water_pct = min(100, int(u['logged_water'] / u['water_goal'] * 100))
-    water_bar = '█' * (water_pct // 10) + '░' * (10 - water_pct // 10)
-    
-    calorie_pct = min(100, int(net_calories / u['calorie_goal'] * 100)) if u['calorie_goal'] > 0 else 0
-    calorie_bar = '█' * (calorie_pct // 10) + '░' * (10 - calorie_pct // 10)
-    
-    response = "📊 Ежедневный прогресс:\n\n"
-    response += f"💧 Вода:\n{water_bar} {water_pct}%\n"
-    response += f"Выпито: {u['logged_water']:.0f} мл из {u['water_goal']} мл\n"
-    
-    if u['logged_water'] >= u['water_goal']:
-        response += "✅ Норма воды выполнена!\n"
-    else:
-        response += f"Осталось: {u['water_goal'] - u['logged_water']:.0f} мл\n"
-    
-    response += "\n🔥 Калории:\n"
-    response += f"{calorie_bar} {calorie_pct}%\n"
-    response += f"Потреблено: {u['logged_calories']:.0f} ккал\n"
-    response += f"Сожжено: {u['burned_calories']:.0f} ккал\n"
-    response += f"Баланс: {net_calories:.0f} ккал из {u['calorie_goal']} ккал\n"
-    
-    if net_calories > u['calorie_goal']:
-        response += "⚠️ Превышение нормы калорий!"
-    elif net_calories >= u['calorie_goal'] * 0.9:
-        response += "✅ Норма почти выполнена!"
+    response = format_daily_progress(message.from_user.id)
     
     # Добавляем рекомендации
     rec_text = format_recommendations(message.from_user.id)
@@ -1092,7 +1576,6 @@ async def check_progress(message: Message):
 @router.message(Command("show_stats"))
 async def show_stats(message: Message):
     ensure_user_exists(message.from_user.id)
-    reset_daily_data(message.from_user.id)
     
     if not is_profile_complete(message.from_user.id):
         await message.answer(
@@ -1104,36 +1587,56 @@ async def show_stats(message: Message):
         return
     
     save_daily_stats(message.from_user.id)
-    chart_buffer = create_progress_charts(message.from_user.id)
     
-    if not chart_buffer:
+    data = get_last_n_days_data(message.from_user.id, 7)
+    if not data[0]:
         await message.answer(
             "📉 Недостаточно данных для построения графика.\n"
             "Запишите хотя бы один день воды или калорий!"
         )
         return
     
-    photo = BufferedInputFile(chart_buffer.read(), filename="progress.png")
+    upload_size = 0
+    cached = chart_cache.get(message.from_user.id, data)
+    if cached and cached.file_id:
+        photo = cached.file_id
+    elif cached:
+        photo = FSInputFile(cached.path)
+        upload_size = os.path.getsize(cached.path)
+    elif admission.overloaded('chart'):
+        # Бот перегружен — вместо графика отправляем текстовую сводку
+        await message.answer(format_stats_summary(message.from_user.id))
+        return
+    else:
+        with admission.track('chart'):
+            loop = asyncio.get_running_loop()
+            chart = await loop.run_in_executor(chart_executor, render_progress_chart, data, CHART_BYTE_BUDGET)
+        photo = BufferedInputFile(chart.data, filename=f"progress.{chart.extension}")
+        upload_size = len(chart.data)
+    
     caption = "📈 Ваш недельный прогресс по воде и калориям"
     
     # Добавляем рекомендации к графику
     rec_text = format_recommendations(message.from_user.id)
+    started = time.monotonic()
     if rec_text:
         caption += f"\n\n💡 Советы:{rec_text}"
-        await message.answer_photo(
+        sent = await message.answer_photo(
             photo=photo,
             caption=caption,
             parse_mode="HTML",
             reply_markup=get_recommendation_buttons(message.from_user.id)
         )
     else:
-        await message.answer_photo(photo=photo, caption=caption)
+        sent = await message.answer_photo(photo=photo, caption=caption)
+    chart_cache.record_send(upload_size, time.monotonic() - started)
+    # Повторный /show_stats без новых записей отправит то же фото без загрузки
+    chart_cache.store_file_id(message.from_user.id, data, sent.photo[-1].file_id)
 
 
 @router.message(Command("recommend"))
 async def recommend(message: Message):
     ensure_user_exists(message.from_user.id)
-    reset_daily_data(message.from_user.id)
     
     if not is_profile_complete(message.from_user.id):
         await message.answer(
@@ -1172,6 +1675,192 @@ async def recommend(message: Message):
     )
 
 
+@router.message(Command("reminders"))
+async def toggle_reminders(message: Message):
+    user_id = message.from_user.id
+    ensure_user_exists(user_id)
+    
+    if not is_profile_complete(user_id):
+        await message.answer(
+            "⚠️ Сначала настройте профиль командой /set_profile",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔧 Настроить профиль", callback_data="set_profile")]
+            ])
+        )
+        return
+    
+    if users[user_id]['reminders']:
+        disable_reminders(user_id)
+        await message.answer("🔕 Напоминания отключены.")
+        return
+    
+    users[user_id]['reminders'] = True
+    schedule_user_reminders(user_id)
+    await message.answer(
+        "🔔 Напоминания включены:\n"
+        "• в 15:00 — если вы отстаёте от нормы воды\n"
+        "• в 20:00 — если за день не записано ни одного приёма пищи\n\n"
+        "Отключить: /reminders"
+    )
+
+
+@router.message(Command("live"))
+async def toggle_live_dashboard(message: Message):
+    user_id = message.from_user.id
+    ensure_user_exists(user_id)
+    
+    if not is_profile_complete(user_id):
+        await message.answer(
+            "⚠️ Сначала настройте профиль командой /set_profile",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔧 Настроить профиль", callback_data="set_profile")]
+            ])
+        )
+        return
+    
+    if users[user_id]['live_dashboard']:
+        users[user_id]['live_dashboard'] = False
+        dashboard.forget(user_id)
+        await message.answer("📋 Живой прогресс отключён: на каждую запись снова будет отдельный ответ.")
+        return
+    
+    users[user_id]['live_dashboard'] = True
+    await message.answer(
+        "📋 Живой прогресс включён: вместо ответа на каждую запись бот обновляет "
+        "одно закреплённое сообщение с прогрессом за день.\n\n"
+        "Отключить: /live"
+    )
+    refresh_dashboard(message, user_id)
+
+
+@router.message(Command("export"))
+async def export_history(message: Message, bot: Bot):
+    user_id = message.from_user.id
+    ensure_user_exists(user_id)
+    
+    parts = message.text.split()
+    fmt = parts[1].lower() if len(parts) > 1 else 'csv'
+    if fmt not in EXPORT_FORMATS:
+        await message.answer(f"❌ Неизвестный формат. Доступные: {', '.join(EXPORT_FORMATS)} (например, /export json)")
+        return
+    
+    if not users[user_id]['history']:
+        await message.answer("📭 История пока пуста — выгружать нечего.")
+        return
+    
+    await bot.send_chat_action(chat_id=message.chat.id, action="upload_document")
+    await message.answer_document(
+        HistoryExportFile(users[user_id]['history'], fmt),
+        caption="📦 Ваша история по дням (gzip)"
+    )
+
+
+@router.message(Command("leaderboard"))
+async def show_leaderboard(message: Message):
+    user_id = message.from_user.id
+    ensure_user_exists(user_id)
+    user = users[user_id]
+    
+    top = leaderboard.top(10)
+    if not top:
+        await message.answer("🏆 Рейтинг пока пуст. Выполните норму воды, чтобы начать серию!")
+        return
+    
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    lines = ["🏆 Лучшие серии по норме воды:\n"]
+    for place, (uid, streak) in enumerate(top, 1):
+        mark = " 👈 вы" if uid == user_id else ""
+        lines.append(f"{medals.get(place, f'{place}.')} {streak} дн. подряд{mark}")
+    
+    rank = leaderboard.rank(user_id)
+    if rank:
+        lines.append(f"\nВаше место: {rank} из {len(leaderboard)} (серия {user.water_streak} дн.)")
+    else:
+        lines.append("\nУ вас пока нет активной серии — выполните норму воды сегодня!")
+    lines.append(
+        f"Лучшая серия: {user.best_water_streak} дн. • "
+        f"Дней с нормой воды: {user.water_goal_days} • с нормой калорий: {user.calorie_goal_days}"
+    )
+    await message.answer("\n".join(lines))
+
+
+@router.message(Command("profile"))
+async def profile_command(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await unknown(message)
+        return
+    
+    parts = message.text.split()
+    if len(parts) == 1:
+        status = "включено" if profiler.active else "выключено"
+        stats = chart_cache.stats
+        uploads = stats['uploads'] or 1
+        resends = stats['resends'] or 1
+        await message.answer(
+            f"🩺 Профилирование {status}.\n"
+            f"Блокировок цикла: {profiler.blocks_detected}, профилей: {profiler.profiles_written}\n"
+            f"Задержка цикла: {admission.loop_lag * 1000:.0f} мс\n"
+            f"Графики: загружено {stats['uploads']} (в среднем {stats['upload_bytes'] / uploads / 1024:.0f} КБ, "
+            f"{stats['upload_seconds'] / uploads * 1000:.0f} мс), "
+            f"по file_id {stats['resends']} ({stats['resend_seconds'] / resends * 1000:.0f} мс)\n"
+            f"Активных пользователей сегодня: ~{len(analytics.today.users)}, подробнее: /admin_stats\n"
+            f"Страницы поиска продуктов: из кэша {food_pages.stats['hits']}, загружено {food_pages.stats['fetches']}, "
+            f"заранее {food_pages.stats['prefetches']}\n"
+            f"Очереди обработчиков:\n{execution.describe()}\n\n"
+            "Включить: /profile <минуты>, выключить: /profile off"
+        )
+        return
+    
+    if parts[1].lower() == 'off':
+        profiler.disable()
+        await message.answer("🩺 Профилирование выключено.")
+        return
+    
+    try:
+        minutes = float(parts[1].replace(',', '.'))
+        if not 1 <= minutes <= 60:
+            raise ValueError
+    except ValueError:
+        await message.answer("❌ Укажите длительность в минутах от 1 до 60 (например, /profile 5)")
+        return
+    
+    profiler.enable(minutes * 60)
+    await message.answer(
+        f"🩺 Профилирование включено на {minutes:g} мин.\n"
+        f"Файлы .pstats сохраняются в {profiler.output_dir}, блокировки цикла — в лог."
+    )
+
+
+@router.message(Command("reload_catalog"))
+async def reload_catalog_command(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await unknown(message)
+        return
+    
+    try:
+        catalog = await catalogs.reload(allow_downgrade=True)
+    except Exception as e:
+        await message.answer(f"❌ Каталог не загружен, остаётся версия {catalogs.current.version}: {e}")
+        return
+    
+    if catalog is None:
+        await message.answer(f"📚 Версия каталога в файле не изменилась: {catalogs.current.version}")
+        return
+    await message.answer(
+        f"📚 Загружен каталог версии {catalog.version}: продуктов {len(catalog.food_fallback)}, "
+        f"тренировок {len(catalog.workout_calories)}"
+    )
+
+
+@router.message(Command("admin_stats"))
+async def admin_stats_command(message: Message):
+    if message.from_user.id not in ADMIN_IDS:
+        await unknown(message)
+        return
+    
+    await message.answer(analytics.describe())
+
+
 @router.message(Command("help"))
 async def help_cmd(message: Message):
     help_text = (
@@ -1179,11 +1868,15 @@ async def help_cmd(message: Message):
         "• /set_profile — настроить профиль (вес, рост, возраст, пол, активность, город)\n"
         "• /view_profile — посмотреть текущие настройки профиля\n"
         "• /log_water — записать выпитую воду\n"
-        "• /log_food — записать съеденный продукт\n"
+        "• /log_food — записать съеденный продукт (по названию или штрихкоду)\n"
         "• /log_workout — записать тренировку\n"
         "• /check_progress — показать прогресс за день\n"
         "• /show_stats — 📈 графики прогресса за неделю\n"
         "• /recommend — 💡 получить персональные рекомендации еды или тренировок\n"
+        "• /reminders — 🔔 включить или отключить напоминания\n"
+        "• /live — 📋 одно обновляемое сообщение с прогрессом вместо ответа на каждую запись\n"
+        "• /export [csv|json] — 📦 выгрузить историю по дням\n"
+        "• /leaderboard — 🏆 рейтинг серий по норме воды\n"
         "• /cancel — отменить текущую операцию ввода"
     )
     await message.answer(help_text, reply_markup=get_cancel_help_buttons())
@@ -1202,11 +1895,80 @@ async def unknown(message: Message):
     )
 
 
-@router.callback_query(lambda c: c.data == "recommend_now")
-async def recommend_now(callback: CallbackQuery):
+async def recommend_now(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
     await recommend(callback.message)
 
 
+# Префикс данных кнопки -> (обработчик, класс данных, класс выполнения из execution.EXECUTION_CLASSES)
+CALLBACK_ROUTES = {
+    QuickFoodCallback.__prefix__: (quick_log_food, QuickFoodCallback, 'cheap'),
+    QuickWorkoutCallback.__prefix__: (quick_log_workout, QuickWorkoutCallback, 'cheap'),
+    WaterPresetCallback.__prefix__: (water_preset, WaterPresetCallback, 'cheap'),
+    WorkoutPresetCallback.__prefix__: (workout_preset, WorkoutPresetCallback, 'cheap'),
+    FoodPickCallback.__prefix__: (food_candidate_pick, FoodPickCallback, 'cheap'),
+    # Страницы без предзагрузки запрашиваются у OpenFoodFacts
+    FoodPageCallback.__prefix__: (food_candidate_page, FoodPageCallback, 'network'),
+    "show_progress": (show_progress_from_callback, None, 'cheap'),
+    "close_recommendations": (close_recommendations, None, 'cheap'),
+    "cancel_operation": (callback_cancel, None, 'cheap'),
+    "show_help": (callback_help, None, 'cheap'),
+    "set_profile": (callback_set_profile, None, 'cheap'),
+    "recommend_now": (recommend_now, None, 'cheap'),
+}
+
+
+def callback_execution_class(callback: CallbackQuery) -> Optional[str]:
+    """Класс выполнения нажатия по его маршруту в CALLBACK_ROUTES"""
+    route = CALLBACK_ROUTES.get((callback.data or "").partition(":")[0])
+    return route[2] if route is not None else None
+
+
+@router.callback_query()
+async def route_callback(callback: CallbackQuery, state: FSMContext):
+    """Единая точка входа для нажатий: обработчик выбирается по префиксу за O(1)"""
+    data = callback.data or ""
+    route = CALLBACK_ROUTES.get(data.partition(":")[0])
+    if route is None:
+        await callback.answer(STALE_BUTTON_TEXT, show_alert=True)
+        return
+    
+    handler, callback_data_cls, _ = route
+    if callback_data_cls is None:
+        await handler(callback, state)
+        return
+    
+    try:
+        callback_data = callback_data_cls.unpack(data)
+    except (TypeError, ValueError):
+        await callback.answer(STALE_BUTTON_TEXT, show_alert=True)
+        return
+    await handler(callback, state, callback_data)
+
+
+# Класс выполнения обработчиков, которые не относятся к дешёвым (см. execution.EXECUTION_CLASSES);
+# для нажатий класс определяется маршрутом
+HANDLER_CLASSES = {
+    process_city: 'network',
+    process_food_product: 'network',
+    inline_food_search: 'network',
+    show_stats: 'cpu',
+    export_history: 'cpu',
+    route_callback: callback_execution_class,
+}
+execution.assignments.update(HANDLER_CLASSES)
+
+
+def start_background_tasks(bot: Bot):
+    """Запускает фоновые задачи бота: закрытие дня, напоминания, их отправку, ночную отрисовку графиков
+    и обновление норм воды, а также общие для процесса задачи, если они ещё не запущены"""
+    asyncio.create_task(rollover.run())
+    asyncio.create_task(reminders.run())
+    asyncio.create_task(sender.run(bot))
+    asyncio.create_task(run_chart_prerender())
+    asyncio.create_task(run_water_goal_refresh())
+    start_shared_tasks()
+
+
 def setup_handlers(dp):
-    dp.include_router(router)
\ No newline at end of file
+    dp.include_router(router)
@@ -0,0 +1,107 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from food_index import FoodIndex
+
+# Сколько найденных в OpenFoodFacts продуктов хранится для подсказок
+FOOD_CACHE_SIZE = 5000
+
+
+class PrefixIndex:
+    """Отсортированный массив (ключ, название) для поиска по префиксу слов за O(log n + k).
+
+    Каждое слово названия индексируется отдельно, поэтому «натур» находит
+    «йогурт натуральный».
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[str, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _keys(name: str) -> List[str]:
+        words = name.lower().split()
+        return [' '.join(words[i:]) for i in range(len(words))]
+
+    def add(self, name: str):
+        for key in self._keys(name):
+            insort(self._entries, (key, name))
+
+    def remove(self, name: str):
+        for key in self._keys(name):
+            i = bisect_left(self._entries, (key, name))
+            if i < len(self._entries) and self._entries[i] == (key, name):
+                self._entries.pop(i)
+
+    def search(self, prefix: str, limit: int) -> List[str]:
+        """Названия, у которых какое-либо слово начинается с prefix (без повторов)"""
+        prefix = prefix.lower()
+        found: List[str] = []
+        i = bisect_left(self._entries, (prefix, ''))
+        while i < len(self._entries) and len(found) < limit:
+            key, name = self._entries[i]
+            if not key.startswith(prefix):
+                break
+            if name not in found:
+                found.append(name)
+            i += 1
+        return found
+
+
+class FoodSuggester:
+    """Подсказки продуктов для inline-режима.
+
+    Объединяет встроенный каталог, локальный индекс OpenFoodFacts
+    и продукты, недавно найденные через OpenFoodFacts (LRU-кэш).
+    get_catalog возвращает текущий каталог (catalog.Catalog) с готовым
+    индексом названий, поэтому подмена каталога сразу видна в подсказках.
+    """
+
+    def __init__(self, get_catalog: Callable[[], Any], get_food_index: Callable[[], Optional[FoodIndex]],
+                 cache_size: int = FOOD_CACHE_SIZE):
+        self._get_catalog = get_catalog
+        self._get_food_index = get_food_index
+        self._cache_size = cache_size
+        self._cache_index = PrefixIndex()
+        self._cache: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+    def remember(self, food: Dict[str, Any]):
+        """Запоминает продукт, найденный через OpenFoodFacts"""
+        key = food['name'].lower()
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return
+        self._cache[key] = food
+        self._cache_index.add(key)
+        if len(self._cache) > self._cache_size:
+            evicted, _ = self._cache.popitem(last=False)
+            self._cache_index.remove(evicted)
+
+    def suggest(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Подходящие продукты: точное совпадение, затем каталог, кэш и локальный индекс"""
+        query = query.strip().lower()
+        if not query:
+            return []
+        results: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+
+        def add(food: Dict[str, Any]):
+            key = food['name'].lower()
+            if key not in results and len(results) < limit:
+                results[key] = food
+
+        catalog = self._get_catalog()
+        if query in catalog.food_fallback:
+            add({'name': query.capitalize(), 'calories': catalog.food_fallback[query]})
+        names = catalog.food_prefix_index.search(query, limit)
+        for name in sorted(names, key=len):
+            add({'name': name.capitalize(), 'calories': catalog.food_fallback[name]})
+        for key in self._cache_index.search(query, limit):
+            add(self._cache[key])
+        index = self._get_food_index()
+        if index and len(results) < limit:
+            for food in index.search_prefix(query, limit - len(results)):
+                add(food)
+        return list(results.values())
@@ -0,0 +1,84 @@
+from bisect import bisect_left, insort
+from typing import Dict, List, Set, Tuple
+
+# Очки больше этого значения считаются равными ему
+MAX_SCORE = 10000
+
+
+class Leaderboard:
+    """Рейтинг пользователей по целочисленным очкам (например, серии дней).
+
+    Число пользователей с каждым значением очков хранится в дереве Фенвика,
+    поэтому обновление и место пользователя считаются за O(log MAX_SCORE),
+    а первые K мест — за O(K) по отсортированному списку встречающихся значений.
+    """
+
+    def __init__(self, max_score: int = MAX_SCORE):
+        self.max_score = max_score
+        self._tree = [0] * (max_score + 2)
+        self._scores: Dict[int, int] = {}
+        self._buckets: Dict[int, Set[int]] = {}
+        self._distinct: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def _add(self, score: int, delta: int):
+        i = score + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _count_up_to(self, score: int) -> int:
+        """Число пользователей с очками <= score"""
+        i, total = score + 1, 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _remove(self, user_id: int):
+        score = self._scores.pop(user_id, None)
+        if score is None:
+            return
+        self._add(score, -1)
+        bucket = self._buckets[score]
+        bucket.discard(user_id)
+        if not bucket:
+            del self._buckets[score]
+            self._distinct.pop(bisect_left(self._distinct, score))
+
+    def update(self, user_id: int, score: int):
+        """Устанавливает очки пользователя; нулевые очки убирают его из рейтинга"""
+        score = min(max(score, 0), self.max_score)
+        if self._scores.get(user_id) == score:
+            return
+        self._remove(user_id)
+        if score == 0:
+            return
+        self._scores[user_id] = score
+        self._add(score, 1)
+        if score not in self._buckets:
+            self._buckets[score] = set()
+            insort(self._distinct, score)
+        self._buckets[score].add(user_id)
+
+    def score(self, user_id: int) -> int:
+        return self._scores.get(user_id, 0)
+
+    def rank(self, user_id: int) -> int | None:
+        """Место пользователя (1 — лучший; при равных очках место общее) или None"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return len(self._scores) - self._count_up_to(score) + 1
+
+    def top(self, k: int) -> List[Tuple[int, int]]:
+        """Первые k пар (user_id, очки) по убыванию очков"""
+        result = []
+        for score in reversed(self._distinct):
+            for user_id in self._buckets[score]:
+                result.append((user_id, score))
+                if len(result) == k:
+                    return result
+        return result
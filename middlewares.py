@@ -1,7 +1,74 @@
+import asyncio
+
 from aiogram import BaseMiddleware
-from aiogram.types import Message
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import CallbackQuery, Message, Update
+
+from analytics import Analytics
+from execution import ExecutionPolicy
+from profiling import Profiler
+from upstream import set_update_deadline
 
 class LoggingMiddleware(BaseMiddleware):
     async def __call__(self, handler, event: Message, data: dict):
         print(f"Получено сообщение: {event.text}")
-        return await handler(event, data)
\ No newline at end of file
+        return await handler(event, data)
+
+
+class AnalyticsMiddleware(BaseMiddleware):
+    """Учитывает активных пользователей и вызовы команд в сводной статистике"""
+
+    def __init__(self, analytics: Analytics):
+        self.analytics = analytics
+
+    async def __call__(self, handler, event, data: dict):
+        if event.from_user is not None:
+            self.analytics.active(event.from_user.id)
+        # Фильтр Command передаёт разобранную команду; неизвестные команды не заводят новых счётчиков
+        command = data.get('command')
+        if command is not None:
+            self.analytics.command(command.command.lower())
+        return await handler(event, data)
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """Выборочно профилирует обработку обновлений, когда профилирование включено"""
+
+    def __init__(self, profiler: Profiler):
+        self.profiler = profiler
+
+    async def __call__(self, handler, event: Update, data: dict):
+        if not self.profiler.should_profile():
+            return await handler(event, data)
+        return await self.profiler.profile(f"update_{event.update_id}", handler(event, data))
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """Задаёт общий бюджет времени на внешние запросы при обработке обновления"""
+
+    async def __call__(self, handler, event: Update, data: dict):
+        set_update_deadline()
+        return await handler(event, data)
+
+
+TIMEOUT_TEXT = "⏳ Не удалось обработать запрос вовремя — бот сейчас перегружен. Попробуйте ещё раз через минуту."
+
+
+class ExecutionMiddleware(BaseMiddleware):
+    """Выполняет обработчики по правилам ExecutionPolicy и сообщает пользователю, если обработчик не успел"""
+
+    def __init__(self, policy: ExecutionPolicy):
+        self.policy = policy
+
+    async def __call__(self, handler, event, data: dict):
+        try:
+            return await self.policy.run(data['handler'].callback, lambda: handler(event, data), event)
+        except asyncio.TimeoutError:
+            try:
+                if isinstance(event, Message):
+                    await event.answer(TIMEOUT_TEXT)
+                elif isinstance(event, CallbackQuery):
+                    await event.answer(TIMEOUT_TEXT, show_alert=True)
+            except TelegramBadRequest:
+                pass
+            return None
@@ -0,0 +1,141 @@
+import struct
+from bisect import bisect_left
+from datetime import date, datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+# Запись истории фиксированной ширины: порядковый номер дня, вода, потреблено,
+# сожжено, норма воды, норма калорий — 24 байта вместо словаря со строковым ключом
+HISTORY_RECORD = struct.Struct('<iIffII')
+# Пределы полей записи: unsigned 32 бита и конечный float32
+UINT32_MAX = 2 ** 32 - 1
+FLOAT32_MAX = 3.4e38
+
+
+def _uint32(value) -> int:
+    return min(max(int(value), 0), UINT32_MAX)
+
+
+def _float32(value: float) -> float:
+    return min(max(float(value), 0.0), FLOAT32_MAX)
+
+
+class DayRecord(NamedTuple):
+    day: int  # date.toordinal()
+    water: int
+    calories_consumed: float
+    calories_burned: float
+    water_goal: int
+    calorie_goal: int
+
+
+class DailyHistory:
+    """История по дням, упакованная в bytearray и отсортированная по номеру дня"""
+
+    __slots__ = ('_data',)
+
+    def __init__(self):
+        self._data = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._data) // HISTORY_RECORD.size
+
+    def __iter__(self) -> Iterator[DayRecord]:
+        # Итерация по копии: историю можно пополнять, пока идёт обход
+        for values in HISTORY_RECORD.iter_unpack(bytes(self._data)):
+            yield DayRecord(*values)
+
+    def _day_at(self, index: int) -> int:
+        return HISTORY_RECORD.unpack_from(self._data, index * HISTORY_RECORD.size)[0]
+
+    def get(self, day: int) -> Optional[DayRecord]:
+        """Возвращает запись за день (по номеру дня) или None"""
+        index = self._find(day)
+        if index < len(self) and self._day_at(index) == day:
+            return DayRecord(*HISTORY_RECORD.unpack_from(self._data, index * HISTORY_RECORD.size))
+        return None
+
+    def _find(self, day: int) -> int:
+        count = len(self)
+        # Чаще всего обновляется последний день
+        if count and self._day_at(count - 1) < day:
+            return count
+        if count and self._day_at(count - 1) == day:
+            return count - 1
+        return bisect_left(range(count), day, key=self._day_at)
+
+    def upsert(self, day: int, water: int, calories_consumed: float, calories_burned: float,
+               water_goal: int, calorie_goal: int):
+        """Записывает итоги дня, заменяя существующую запись за этот день (значения вне диапазона полей обрезаются)"""
+        packed = HISTORY_RECORD.pack(day, _uint32(water), _float32(calories_consumed), _float32(calories_burned),
+                                     _uint32(water_goal), _uint32(calorie_goal))
+        index = self._find(day)
+        start = index * HISTORY_RECORD.size
+        if index < len(self) and self._day_at(index) == day:
+            self._data[start:start + HISTORY_RECORD.size] = packed
+        else:
+            self._data[start:start] = packed
+
+    def last(self, n: int) -> List[DayRecord]:
+        """Возвращает последние n записей в порядке дат"""
+        start = max(0, len(self) - n) * HISTORY_RECORD.size
+        return [DayRecord(*values) for values in HISTORY_RECORD.iter_unpack(bytes(self._data[start:]))]
+
+
+class User:
+    """Профиль и дневные счётчики пользователя.
+
+    Поддерживает доступ по ключу (user['water_goal']) и update(), как у словаря,
+    которым пользователь был раньше.
+    """
+
+    __slots__ = (
+        'weight', 'height', 'age', 'gender', 'activity', 'city',
+        'water_goal', 'calorie_goal',
+        'logged_water', 'logged_calories', 'burned_calories',
+        'last_update', 'utc_offset', 'day', 'reminders', 'live_dashboard', 'history',
+        'water_streak', 'best_water_streak', 'streak_day', 'water_goal_days', 'calorie_goal_days',
+        'entry_counts',
+    )
+
+    def __init__(self, utc_offset: int, day: date):
+        self.weight: Optional[float] = None
+        self.height: Optional[float] = None
+        self.age: Optional[int] = None
+        self.gender: Optional[str] = None
+        self.activity: Optional[int] = None
+        self.city: Optional[str] = None
+        self.water_goal = 2000
+        self.calorie_goal = 2000
+        self.logged_water = 0
+        self.logged_calories = 0
+        self.burned_calories = 0
+        self.last_update = datetime.now()
+        self.utc_offset = utc_offset
+        self.day = day
+        self.reminders = False
+        self.live_dashboard = False
+        self.history = DailyHistory()
+        # Серия дней с выполненной нормой воды; streak_day — номер последнего засчитанного дня
+        self.water_streak = 0
+        self.best_water_streak = 0
+        self.streak_day = 0
+        self.water_goal_days = 0
+        self.calorie_goal_days = 0
+        # Счётчики записей для кнопок частых записей; создаются при первой записи
+        self.entry_counts: Optional[Dict[Any, int]] = None
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def update(self, values: Dict[str, Any]):
+        for key, value in values.items():
+            self[key] = value
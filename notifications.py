@@ -0,0 +1,47 @@
+import asyncio
+from typing import Callable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+
+# Telegram допускает около 30 сообщений в секунду в разные чаты
+DEFAULT_SEND_RATE = 25
+
+
+class RateLimitedSender:
+    """Очередь исходящих сообщений, отправляемых не быстрее заданной частоты"""
+
+    def __init__(self, rate: float = DEFAULT_SEND_RATE, on_blocked: Optional[Callable[[int], None]] = None):
+        self._interval = 1 / rate
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._on_blocked = on_blocked
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def enqueue(self, chat_id: int, text: str, **kwargs):
+        """Ставит сообщение в очередь на отправку"""
+        self._queue.put_nowait((chat_id, text, kwargs))
+
+    async def run(self, bot: Bot):
+        """Фоновый цикл отправки сообщений из очереди"""
+        loop = asyncio.get_running_loop()
+        while True:
+            chat_id, text, kwargs = await self._queue.get()
+            started = loop.time()
+            try:
+                await bot.send_message(chat_id, text, **kwargs)
+            except TelegramRetryAfter as e:
+                # Telegram просит подождать — ждём и ставим сообщение обратно
+                await asyncio.sleep(e.retry_after)
+                self.enqueue(chat_id, text, **kwargs)
+            except TelegramForbiddenError:
+                # Пользователь заблокировал бота
+                if self._on_blocked:
+                    self._on_blocked(chat_id)
+            except TelegramAPIError as e:
+                # Ошибка запроса, сети или сервера Telegram: сообщение пропускаем, очередь продолжает работу
+                print(f"Не удалось отправить сообщение {chat_id}: {e}")
+            except Exception as e:
+                print(f"Ошибка отправки сообщения {chat_id}: {e!r}")
+            await asyncio.sleep(max(0.0, self._interval - (loop.time() - started)))
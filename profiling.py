@@ -0,0 +1,98 @@
+import asyncio
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+# Как часто цикл событий отмечается для детектора блокировок
+HEARTBEAT_INTERVAL = 0.02
+# Блокировка цикла дольше этого времени логируется со стеком
+BLOCK_THRESHOLD_MS = 100
+# Доля обновлений, которые профилируются во время включённого профилирования
+PROFILE_SAMPLE_RATE = 0.1
+
+
+class Profiler:
+    """Профилирование по требованию: детектор блокировок цикла и выборочный cProfile обновлений.
+
+    Пока профилирование выключено, вся стоимость — одно сравнение времени
+    в middleware на каждое обновление.
+    """
+
+    def __init__(self, output_dir: str, block_threshold_ms: int = BLOCK_THRESHOLD_MS,
+                 sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.output_dir = output_dir
+        self.block_threshold = block_threshold_ms / 1000
+        self.sample_rate = sample_rate
+        self.until = 0.0
+        self.profiles_written = 0
+        self.blocks_detected = 0
+        self._profiling_update = False
+        self._last_tick = 0.0
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    @property
+    def active(self) -> bool:
+        return time.monotonic() < self.until
+
+    def enable(self, seconds: float):
+        """Включает профилирование на seconds секунд (вызывать из цикла событий)"""
+        self.until = time.monotonic() + seconds
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        if self._watchdog is None or not self._watchdog.is_alive():
+            self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            self._watchdog.start()
+
+    def disable(self):
+        self.until = 0.0
+
+    async def _heartbeat(self):
+        while self.active:
+            self._last_tick = time.monotonic()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    def _watch(self):
+        """Поток-наблюдатель: если цикл давно не отмечался, логирует стек потока цикла"""
+        reported_tick = None
+        while self.active:
+            time.sleep(HEARTBEAT_INTERVAL)
+            tick = self._last_tick
+            blocked_for = time.monotonic() - tick
+            if blocked_for >= self.block_threshold and tick != reported_tick:
+                reported_tick = tick
+                self.blocks_detected += 1
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = ''.join(traceback.format_stack(frame)) if frame else '(стек недоступен)\n'
+                print(f"⚠️ Цикл событий заблокирован на {blocked_for * 1000:.0f} мс:\n{stack}", file=sys.stderr)
+
+    def should_profile(self) -> bool:
+        """Решает, профилировать ли очередное обновление"""
+        return self.active and not self._profiling_update and random.random() < self.sample_rate
+
+    async def profile(self, name: str, coro):
+        """Выполняет корутину под cProfile и сохраняет результат в .pstats.
+
+        Профиль охватывает всё, что выполнялось в цикле за время обработки
+        обновления, включая другие задачи, поэтому одновременно снимается только один.
+        """
+        self._profiling_update = True
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return await coro
+        finally:
+            profile.disable()
+            self._profiling_update = False
+            path = os.path.join(self.output_dir, f"{name}_{int(time.time() * 1000)}.pstats")
+            profile.dump_stats(path)
+            self.profiles_written += 1
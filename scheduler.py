@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import time
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, List, Set, Tuple
+
+SECONDS_PER_DAY = 86400
+FIRE_BATCH_SIZE = 1000
+
+
+def local_date(offset: int, ts: float | None = None) -> date:
+    """Возвращает локальную дату для смещения от UTC (в секундах)"""
+    if ts is None:
+        ts = time.time()
+    return datetime.fromtimestamp(ts + offset, tz=timezone.utc).date()
+
+
+def next_local_time_ts(offset: int, seconds: int, ts: float | None = None) -> float:
+    """Возвращает UTC-время ближайшего наступления локального времени суток (в секундах от полуночи)"""
+    if ts is None:
+        ts = time.time()
+    day = local_date(offset, ts)
+    midnight = datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp() - offset
+    fire_at = midnight + seconds
+    if fire_at <= ts:
+        fire_at += SECONDS_PER_DAY
+    return fire_at
+
+
+def next_midnight_ts(offset: int, ts: float | None = None) -> float:
+    """Возвращает UTC-время ближайшей локальной полуночи для смещения"""
+    return next_local_time_ts(offset, 0, ts)
+
+
+class TimerHeap(ABC):
+    """Минимальная куча таймеров с фоновым циклом ожидания ближайшего срабатывания"""
+
+    def __init__(self):
+        self._heap: List[tuple] = []
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _push(self, entry: tuple):
+        if not self._heap or entry[0] < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, entry)
+
+    @abstractmethod
+    def _fire(self, entry: tuple):
+        """Обрабатывает наступивший таймер"""
+
+    def fire_due(self, now: float | None = None, limit: int | None = None) -> int:
+        """Срабатывает по наступившим таймерам (не более limit за вызов); возвращает их число"""
+        if now is None:
+            now = time.time()
+        fired = 0
+        while self._heap and self._heap[0][0] <= now and (limit is None or fired < limit):
+            entry = heapq.heappop(self._heap)
+            try:
+                self._fire(entry)
+            except Exception as e:
+                # Ошибка одного таймера не должна останавливать цикл для остальных пользователей
+                print(f"Ошибка таймера {entry!r}: {e!r}")
+            fired += 1
+        return fired
+
+    async def run(self):
+        """Фоновый цикл: спит до ближайшего таймера"""
+        while True:
+            # Большие пачки обрабатываем частями, чтобы не блокировать цикл событий
+            if self.fire_due(limit=FIRE_BATCH_SIZE) == FIRE_BATCH_SIZE:
+                await asyncio.sleep(0)
+                continue
+            delay = self._heap[0][0] - time.time() if self._heap else SECONDS_PER_DAY
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, delay))
+            except asyncio.TimeoutError:
+                pass
+
+
+class RolloverScheduler(TimerHeap):
+    """Закрывает день пользователей в их локальную полночь, по одной записи в куче на часовой пояс"""
+
+    def __init__(self, on_rollover: Callable[[List[int]], None]):
+        super().__init__()
+        self._on_rollover = on_rollover
+        self._buckets: Dict[int, Set[int]] = {}
+
+    def add_user(self, user_id: int, offset: int):
+        """Добавляет пользователя в группу его часового пояса"""
+        bucket = self._buckets.get(offset)
+        if bucket is None:
+            bucket = self._buckets[offset] = set()
+            self._push((next_midnight_ts(offset), offset))
+        bucket.add(user_id)
+
+    def move_user(self, user_id: int, old_offset: int, new_offset: int):
+        """Переносит пользователя в другой часовой пояс (например, после смены города)"""
+        if old_offset == new_offset:
+            return
+        bucket = self._buckets.get(old_offset)
+        if bucket is not None:
+            bucket.discard(user_id)
+        self.add_user(user_id, new_offset)
+
+    def _fire(self, entry: Tuple[float, int]):
+        fire_at, offset = entry
+        bucket = self._buckets.get(offset)
+        if not bucket:
+            # Пустой пояс больше не планируем
+            self._buckets.pop(offset, None)
+            return
+        # Следующая полночь планируется до вызова: ошибка в on_rollover не снимает пояс с расписания
+        self._push((next_midnight_ts(offset, fire_at), offset))
+        self._on_rollover(list(bucket))
+
+
+class ReminderScheduler(TimerHeap):
+    """Куча напоминаний: одна запись (время, user_id, вид, поколение) на напоминание"""
+
+    def __init__(self, on_fire: Callable[[int, str, float], None]):
+        super().__init__()
+        self._on_fire = on_fire
+        self._generation: Dict[int, int] = {}
+        self._enabled: Set[int] = set()
+
+    # Отключение не ищет записи в куче: записи устаревшего поколения отбрасываются при срабатывании
+    def enable(self, user_id: int):
+        """Начинает новое поколение напоминаний пользователя (старые записи становятся недействительными)"""
+        self._generation[user_id] = self._generation.get(user_id, 0) + 1
+        self._enabled.add(user_id)
+
+    def disable(self, user_id: int):
+        """Отключает все запланированные напоминания пользователя"""
+        self._enabled.discard(user_id)
+
+    def schedule(self, user_id: int, kind: str, fire_at: float):
+        """Планирует напоминание вида kind на момент fire_at"""
+        if user_id not in self._enabled:
+            return
+        self._push((fire_at, user_id, kind, self._generation[user_id]))
+
+    def _fire(self, entry: Tuple[float, int, str, int]):
+        fire_at, user_id, kind, generation = entry
+        if user_id not in self._enabled or self._generation[user_id] != generation:
+            return
+        self._on_fire(user_id, kind, fire_at)
@@ -0,0 +1,70 @@
+"""Ресурсы, общие для всех ботов процесса.
+
+Каждый бот (см. tenants.py) получает свою копию модуля handlers с собственными
+пользователями и роутером, а справочники, индекс продуктов, кэши и выключатели
+внешних сервисов, кэш погоды, поток отрисовки графиков и контроль нагрузки существуют
+в процессе в одном экземпляре.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from admission import AdmissionController, INFLIGHT_LIMITS
+from catalog import CatalogStore
+from execution import ExecutionPolicy, EXECUTION_CLASSES
+from food_index import FoodIndex, BarcodeCache
+from food_search import FoodSearchPages
+from inline_search import FoodSuggester
+from profiling import Profiler
+from upstream import Upstream
+from weather import WeatherCache
+
+from config import FOOD_INDEX_PATH, PROFILE_DIR, CATALOG_PATH, OPENWEATHER_API_KEY
+
+admission = AdmissionController(INFLIGHT_LIMITS)
+# pyplot не потокобезопасен — графики всех ботов строятся в одном отдельном потоке
+chart_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='charts')
+# Ночная отрисовка ботов идёт по очереди, чтобы пулы процессов не делили ядра
+chart_prerender_lock = asyncio.Lock()
+profiler = Profiler(PROFILE_DIR)
+# Ограничения одновременных обработчиков общие; классы обработчиков добавляет каждая копия handlers
+execution = ExecutionPolicy(EXECUTION_CLASSES, {})
+
+# Справочники продуктов и тренировок; обработчик берёт catalogs.current один раз
+catalogs = CatalogStore(CATALOG_PATH)
+
+food_upstream = Upstream('OpenFoodFacts')
+weather_upstream = Upstream('OpenWeather')
+# Погода по городам: боты, обновляющие нормы воды в один час, запрашивают каждый город один раз
+weather_cache = WeatherCache(weather_upstream, OPENWEATHER_API_KEY)
+# Ответы OpenFoodFacts по штрихкодам, которых нет в локальном индексе
+barcode_cache = BarcodeCache()
+# Страницы поиска продуктов по названию для выбора из нескольких кандидатов
+food_pages = FoodSearchPages(food_upstream)
+
+food_index: Optional[FoodIndex] = None
+
+
+def get_food_index() -> Optional[FoodIndex]:
+    """Открывает локальный индекс продуктов при первом обращении, если он собран"""
+    global food_index
+    if food_index is None and os.path.exists(FOOD_INDEX_PATH):
+        food_index = FoodIndex(FOOD_INDEX_PATH)
+    return food_index
+
+
+# Подсказки для inline-поиска (@bot банан)
+suggester = FoodSuggester(lambda: catalogs.current, get_food_index)
+
+_shared_tasks_started = False
+
+
+def start_shared_tasks():
+    """Запускает общие фоновые задачи (слежение за файлом каталога и замер задержки цикла) один раз на процесс"""
+    global _shared_tasks_started
+    if _shared_tasks_started:
+        return
+    _shared_tasks_started = True
+    asyncio.create_task(catalogs.watch())
+    asyncio.create_task(admission.run_lag_monitor())
@@ -0,0 +1,201 @@
+"""Многопроцессный режим: обновления распределяются по процессам по user_id.
+
+Главный процесс получает обновления (long polling) и отправляет каждое
+в процесс user_id % N. Каждый процесс держит свою часть пользователей
+в памяти, а обновления одного пользователя обрабатывает строго по порядку.
+Обновление считается обработанным только после подтверждения от процесса,
+поэтому при перезапуске упавшего процесса неподтверждённые обновления
+отправляются заново.
+"""
+import asyncio
+import multiprocessing
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.types import Update
+
+from upstream import close_session
+
+HEARTBEAT_INTERVAL = 5
+# Процесс без признаков жизни дольше этого времени перезапускается
+HEARTBEAT_TIMEOUT = 30
+# Сколько неподтверждённых обновлений может быть у одного процесса, прежде чем опрос приостановится
+MAX_INFLIGHT_PER_WORKER = 1000
+POLL_TIMEOUT = 30
+# Сколько ждать завершения процессов при остановке, прежде чем их принудительно завершить
+WORKER_STOP_TIMEOUT = 10
+
+_mp = multiprocessing.get_context('spawn')
+
+
+def get_update_user_id(update: Update) -> int:
+    """Возвращает id пользователя (или чата), которому принадлежит обновление"""
+    event = update.event
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, 'chat', None)
+    if chat is not None:
+        return chat.id
+    return 0
+
+
+async def _process_in_order(previous: Optional[asyncio.Task], dp, bot: Bot,
+                            update_id: int, payload: Dict[str, Any], acks):
+    if previous is not None:
+        # Ошибки предыдущего обновления не должны останавливать очередь пользователя
+        await asyncio.gather(previous, return_exceptions=True)
+    try:
+        await dp.feed_raw_update(bot, payload)
+    finally:
+        acks.put(('ack', update_id))
+
+
+async def _worker_main(shard: int, token: str, inbox, acks):
+    from bot import create_dispatcher
+    from handlers import start_background_tasks
+
+    bot = Bot(token=token)
+    dp = create_dispatcher()
+    start_background_tasks(bot)
+    loop = asyncio.get_running_loop()
+    # Последняя задача каждого пользователя: следующая ждёт её завершения
+    chains: Dict[int, asyncio.Task] = {}
+
+    async def heartbeat():
+        while True:
+            acks.put(('heartbeat', shard))
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+    asyncio.create_task(heartbeat())
+    print(f"Процесс {shard} запущен")
+
+    while True:
+        item = await loop.run_in_executor(None, inbox.get)
+        if item is None:
+            break
+        update_id, user_id, payload = item
+        task = asyncio.create_task(
+            _process_in_order(chains.get(user_id), dp, bot, update_id, payload, acks)
+        )
+        chains[user_id] = task
+        task.add_done_callback(
+            lambda t, uid=user_id: chains.pop(uid, None) if chains.get(uid) is t else None
+        )
+
+    if chains:
+        await asyncio.gather(*chains.values(), return_exceptions=True)
+    await bot.session.close()
+    await close_session()
+
+
+def _worker_entry(shard: int, token: str, inbox, acks):
+    asyncio.run(_worker_main(shard, token, inbox, acks))
+
+
+class Worker:
+    """Процесс-обработчик и его неподтверждённые обновления"""
+
+    def __init__(self, shard: int, token: str, acks):
+        self.shard = shard
+        self.token = token
+        self.acks = acks
+        self.inflight: 'OrderedDict[int, Tuple[int, Dict[str, Any]]]' = OrderedDict()
+        self.process = None
+        self.inbox = None
+        self.last_heartbeat = 0.0
+
+    def start(self):
+        """Запускает процесс и заново отправляет ему все неподтверждённые обновления"""
+        self.inbox = _mp.Queue()
+        self.process = _mp.Process(
+            target=_worker_entry, args=(self.shard, self.token, self.inbox, self.acks), daemon=True
+        )
+        self.process.start()
+        self.last_heartbeat = time.monotonic()
+        for update_id, (user_id, payload) in self.inflight.items():
+            self.inbox.put((update_id, user_id, payload))
+
+    def submit(self, update_id: int, user_id: int, payload: Dict[str, Any]):
+        self.inflight[update_id] = (user_id, payload)
+        self.inbox.put((update_id, user_id, payload))
+
+    def is_healthy(self) -> bool:
+        return self.process.is_alive() and time.monotonic() - self.last_heartbeat < HEARTBEAT_TIMEOUT
+
+    def restart(self):
+        print(f"Процесс {self.shard} не отвечает, перезапуск ({len(self.inflight)} обновлений в работе)")
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.start()
+
+
+async def run_sharded(token: str, workers: int):
+    """Запускает главный процесс: опрос Telegram и распределение обновлений по процессам"""
+    acks = _mp.Queue()
+    pool: List[Worker] = [Worker(shard, token, acks) for shard in range(workers)]
+    for worker in pool:
+        worker.start()
+    shard_by_update: Dict[int, Worker] = {}
+    loop = asyncio.get_running_loop()
+
+    async def read_acks():
+        while True:
+            kind, value = await loop.run_in_executor(None, acks.get)
+            if kind == 'stop':
+                return
+            if kind == 'ack':
+                worker = shard_by_update.pop(value, None)
+                if worker is not None:
+                    worker.inflight.pop(value, None)
+            elif kind == 'heartbeat':
+                pool[value].last_heartbeat = time.monotonic()
+
+    async def supervise():
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            for worker in pool:
+                if not worker.is_healthy():
+                    worker.restart()
+
+    reader = asyncio.create_task(read_acks())
+    supervisor = asyncio.create_task(supervise())
+
+    bot = Bot(token=token)
+    offset = None
+    try:
+        while True:
+            if any(len(worker.inflight) >= MAX_INFLIGHT_PER_WORKER for worker in pool):
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT)
+            except TelegramNetworkError as e:
+                print(f"Ошибка опроса Telegram: {e}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                user_id = get_update_user_id(update)
+                worker = pool[user_id % workers]
+                shard_by_update[update.update_id] = worker
+                worker.submit(update.update_id, user_id,
+                              update.model_dump(mode='json', by_alias=True, exclude_none=True))
+    finally:
+        supervisor.cancel()
+        for worker in pool:
+            worker.inbox.put(None)
+        await bot.session.close()
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT
+        for worker in pool:
+            await loop.run_in_executor(None, worker.process.join, max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+        # Будит поток, ожидающий acks.get, иначе asyncio.run не дождётся остановки пула потоков
+        acks.put(('stop', None))
+        await asyncio.gather(reader, return_exceptions=True)
@@ -0,0 +1,99 @@
+"""Несколько ботов (токенов) в одном процессе.
+
+Список ботов задаётся JSON-файлом TENANTS_PATH:
+
+    [
+        {"name": "fit", "token_env": "FIT_BOT_TOKEN", "admin_ids": [123]},
+        {"name": "aqua", "token": "123456:ABC...", "admin_ids": []}
+    ]
+
+Для каждого бота загружается своя копия модуля handlers: у неё свои пользователи,
+роутер, диспетчер (а с ним и хранилище состояний FSM), рейтинг, напоминания,
+статистика и папка графиков. Общие ресурсы — справочники, индекс продуктов, кэши,
+внешние сервисы и отрисовка графиков — берутся из services и не дублируются.
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import re
+from types import ModuleType
+from typing import FrozenSet, List, NamedTuple, Optional
+
+from aiogram import Bot
+
+from config import TOKEN, ADMIN_IDS, CHART_CACHE_DIR
+from upstream import close_session
+
+
+class TenantConfig(NamedTuple):
+    name: str
+    token: str
+    admin_ids: FrozenSet[int]
+    chart_cache_dir: str
+
+
+# Бот из BOT_TOKEN и ADMIN_IDS — при запуске без TENANTS_PATH
+DEFAULT_TENANT = TenantConfig('default', TOKEN, frozenset(ADMIN_IDS), CHART_CACHE_DIR)
+TENANT_NAME_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+# Бот, для которого сейчас выполняется копия модуля handlers
+_loading: Optional[TenantConfig] = None
+
+
+def current_tenant() -> TenantConfig:
+    """Настройки бота, которого обслуживает загружаемый модуль handlers"""
+    return _loading or DEFAULT_TENANT
+
+
+def load_tenants(path: str) -> List[TenantConfig]:
+    """Читает список ботов; ошибки в файле приводят к ValueError"""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    tenants = []
+    for entry in entries:
+        name = entry['name']
+        if not TENANT_NAME_RE.match(name) or any(t.name == name for t in tenants):
+            raise ValueError(f"недопустимое или повторяющееся имя бота: {name!r}")
+        token = entry.get('token') or os.getenv(entry.get('token_env', ''))
+        if not token:
+            raise ValueError(f"не задан токен бота {name}")
+        tenants.append(TenantConfig(
+            name, token, frozenset(int(x) for x in entry.get('admin_ids', ())),
+            entry.get('chart_cache_dir') or os.path.join(CHART_CACHE_DIR, name)
+        ))
+    if not tenants:
+        raise ValueError("список ботов пуст")
+    return tenants
+
+
+def load_handlers(tenant: TenantConfig) -> ModuleType:
+    """Загружает отдельную копию модуля handlers для бота tenant"""
+    global _loading
+    spec = importlib.util.spec_from_file_location(f"handlers_{tenant.name}", importlib.util.find_spec('handlers').origin)
+    module = importlib.util.module_from_spec(spec)
+    _loading = tenant
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        _loading = None
+    return module
+
+
+async def run_tenants(tenants: List[TenantConfig]):
+    """Запускает опрос Telegram для всех ботов в одном цикле событий"""
+    from bot import create_dispatcher
+
+    polling = []
+    for tenant in tenants:
+        handlers = load_handlers(tenant)
+        bot = Bot(token=tenant.token)
+        dp = create_dispatcher(handlers)
+        handlers.start_background_tasks(bot)
+        # Сигналы останавливают весь процесс, а не диспетчер, установивший обработчик последним
+        polling.append(dp.start_polling(bot, handle_signals=False))
+    print(f"Боты: {', '.join(t.name for t in tenants)}")
+    try:
+        await asyncio.gather(*polling)
+    finally:
+        await close_session()
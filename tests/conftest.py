@@ -0,0 +1,7 @@
+"""Общие настройки тестов: модули бота импортируются из корня репозитория."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config читает токен при импорте; сеть в тестах не используется
+os.environ.setdefault('BOT_TOKEN', '123456:TEST')
@@ -0,0 +1,61 @@
+"""Смена часового пояса пользователя и закрытие дня."""
+from datetime import datetime, timezone
+
+import pytest
+
+import handlers
+import scheduler
+
+
+def utc_ts(day: int, hour: int) -> float:
+    return datetime(2026, 10, day, hour, tzinfo=timezone.utc).timestamp() - handlers.DEFAULT_UTC_OFFSET
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {'ts': 0.0}
+    monkeypatch.setattr(scheduler.time, 'time', lambda: now['ts'])
+    return now
+
+
+@pytest.fixture
+def user_id():
+    user_id = 777
+    handlers.users.pop(user_id, None)
+    yield user_id
+    handlers.users.pop(user_id, None)
+
+
+def test_west_offset_continues_previous_day(clock, user_id):
+    # Сервер уже перешёл на 19-е, а у пользователя западнее ещё 18-е
+    clock['ts'] = utc_ts(19, 1)
+    handlers.ensure_user_exists(user_id)
+    user = handlers.users[user_id]
+    assert user['day'].day == 19
+
+    handlers.set_user_utc_offset(user_id, handlers.DEFAULT_UTC_OFFSET - 5 * 3600)
+    assert user['day'].day == 18
+    assert len(user.history) == 0
+    user['logged_water'] = 1500
+
+    # Полночь в поясе пользователя закрывает 18-е отдельной записью
+    clock['ts'] = utc_ts(19, 5)
+    handlers.finalize_day([user_id])
+    assert user['day'].day == 19
+    assert user['logged_water'] == 0
+    records = list(user.history)
+    assert len(records) == 1
+    assert records[0].day == user['day'].toordinal() - 1
+    assert records[0].water == 1500
+
+
+def test_east_offset_closes_current_day(clock, user_id):
+    clock['ts'] = utc_ts(18, 23)
+    handlers.ensure_user_exists(user_id)
+    user = handlers.users[user_id]
+    user['logged_water'] = 800
+
+    handlers.set_user_utc_offset(user_id, handlers.DEFAULT_UTC_OFFSET + 3 * 3600)
+    assert user['day'].day == 19
+    assert user['logged_water'] == 0
+    assert [record.water for record in user.history] == [800]
@@ -0,0 +1,188 @@
+"""Устойчивые запросы к внешним API (OpenFoodFacts, OpenWeather).
+
+Каждый внешний сервис — объект Upstream со своим автоматическим выключателем.
+Запрос:
+- ограничен общим бюджетом времени текущего обновления (set_update_deadline);
+- дублируется вторым запросом, если первый отвечает дольше p95 прошлых ответов;
+- повторяется при ошибке с экспоненциальной задержкой со случайным разбросом;
+- не выполняется вовсе, пока выключатель сервиса разомкнут.
+"""
+import asyncio
+import contextvars
+import random
+import time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+
+# Общий бюджет времени на все внешние запросы одного обновления
+UPDATE_DEADLINE = 10.0
+# Задержка дублирующего запроса, пока не набрано достаточно замеров
+DEFAULT_HEDGE_DELAY = 1.0
+MIN_LATENCY_SAMPLES = 20
+RETRY_BASE_DELAY = 0.2
+# После стольких ошибок подряд выключатель размыкается на BREAKER_COOLDOWN секунд
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('upstream_deadline', default=None)
+_session: Optional[aiohttp.ClientSession] = None
+
+
+class UpstreamError(Exception):
+    """Внешний сервис недоступен: ошибка сети, разомкнутый выключатель или исчерпан бюджет времени"""
+
+
+class RetryableStatus(Exception):
+    """Ответ 5xx/429 — такой запрос имеет смысл повторить"""
+
+
+def set_update_deadline(seconds: float = UPDATE_DEADLINE):
+    """Задаёт бюджет времени на внешние запросы для текущего обновления"""
+    _deadline.set(time.monotonic() + seconds)
+
+
+def remaining_budget() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Общая HTTP-сессия для всех внешних сервисов (создаётся при первом запросе)"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession()
+    return _session
+
+
+async def close_session():
+    """Закрывает общую HTTP-сессию при остановке бота"""
+    if _session is not None and not _session.closed:
+        await _session.close()
+
+
+class CircuitBreaker:
+    """Автоматический выключатель: после серии ошибок на время перестаёт пропускать запросы"""
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """Пропускать ли запрос; в полуоткрытом состоянии пропускается пробный запрос"""
+        state = self.state
+        if state == 'half-open':
+            # Следующий пробный запрос — не раньше, чем через cooldown
+            self.opened_at = time.monotonic()
+            return True
+        return state == 'closed'
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class Upstream:
+    """Внешний HTTP-сервис с дублированием запросов, повторами и выключателем"""
+
+    def __init__(self, name: str, timeout: float = 8.0, retries: int = 2, hedge: bool = True):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.breaker = CircuitBreaker()
+        self.latencies: deque = deque(maxlen=200)
+        self.stats = {'requests': 0, 'hedged': 0, 'retries': 0, 'failures': 0, 'rejected': 0}
+
+    def hedge_delay(self) -> float:
+        """p95 задержки последних успешных ответов"""
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    async def _attempt(self, url: str, params: Optional[Dict[str, Any]], timeout: float) -> Tuple[int, Any]:
+        started = time.monotonic()
+        async with get_session().get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status >= 500 or response.status == 429:
+                raise RetryableStatus(response.status)
+            data = await response.json(content_type=None) if response.status == 200 else None
+        self.latencies.append(time.monotonic() - started)
+        return response.status, data
+
+    async def _hedged_attempt(self, url: str, params: Optional[Dict[str, Any]], timeout: float) -> Tuple[int, Any]:
+        first = asyncio.create_task(self._attempt(url, params, timeout))
+        if not self.hedge:
+            return await first
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_delay(), timeout))
+            if done:
+                return first.result()
+
+            self.stats['hedged'] += 1
+            tasks.append(asyncio.create_task(self._attempt(url, params, timeout)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Незавершённые попытки отменяются и дожидаются и при отмене самого запроса,
+            # чтобы ни одна не осталась работать, а их ошибки не остались непрочитанными
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get_json(self, url: str, params: Optional[Dict[str, Any]] = None) -> Tuple[int, Any]:
+        """Выполняет GET-запрос и возвращает (код ответа, JSON при коде 200 или None).
+
+        Ответы 4xx возвращаются как есть и не считаются ошибкой сервиса.
+        """
+        self.stats['requests'] += 1
+        if not self.breaker.allow():
+            self.stats['rejected'] += 1
+            raise UpstreamError(f"{self.name}: сервис временно отключён после серии ошибок")
+
+        for attempt in range(self.retries + 1):
+            budget = remaining_budget()
+            timeout = self.timeout if budget is None else min(self.timeout, budget)
+            if timeout <= 0:
+                break
+            try:
+                result = await self._hedged_attempt(url, params, timeout)
+                self.breaker.record_success()
+                return result
+            except (aiohttp.ClientError, asyncio.TimeoutError, RetryableStatus, ValueError):
+                self.breaker.record_failure()
+                self.stats['failures'] += 1
+                if attempt == self.retries or not self.breaker.allow():
+                    break
+            self.stats['retries'] += 1
+            # Экспоненциальная задержка с полным случайным разбросом
+            delay = random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt)
+            budget = remaining_budget()
+            if budget is not None and delay >= budget:
+                break
+            await asyncio.sleep(delay)
+        raise UpstreamError(f"{self.name}: нет ответа")
@@ -0,0 +1,82 @@
+"""Погода в городах пользователей из OpenWeather с кэшем по городу.
+
+Кэш общий для всех ботов процесса (см. services.py): одновременные запросы
+одного города объединяются, а ответ используется повторно WEATHER_TTL секунд,
+поэтому ежедневное обновление норм воды у нескольких ботов запрашивает
+каждый город один раз.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from upstream import Upstream, UpstreamError
+
+WEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+# Сколько городов хранится и сколько секунд погода в них считается свежей
+WEATHER_CACHE_SIZE = 5000
+WEATHER_TTL = 1800.0
+
+
+def city_key(city: str) -> str:
+    return ' '.join(city.lower().split())
+
+
+class WeatherCache:
+    """Ответы OpenWeather по городу, в том числе «город не найден» (404); остальные ошибки не кэшируются"""
+
+    def __init__(self, upstream: Upstream, api_key: Optional[str],
+                 cache_size: int = WEATHER_CACHE_SIZE, ttl: float = WEATHER_TTL):
+        self.upstream = upstream
+        self.api_key = api_key
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, Tuple[Dict[str, Any], float]]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {'hits': 0, 'fetches': 0}
+
+    def cached(self, city: str) -> Optional[Dict[str, Any]]:
+        key = city_key(city)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        weather, expires = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return weather
+
+    async def get(self, city: str) -> Dict[str, Any]:
+        """{'success': True, 'temp', 'utc_offset'} или {'success': False, 'error'}"""
+        weather = self.cached(city)
+        if weather is not None:
+            self.stats['hits'] += 1
+            return weather
+        key = city_key(city)
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats['fetches'] += 1
+            task = self._inflight[key] = asyncio.create_task(self._fetch(key, city))
+            task.add_done_callback(lambda t: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, city: str) -> Dict[str, Any]:
+        try:
+            status, data = await self.upstream.get_json(
+                WEATHER_URL, params={'q': city, 'appid': self.api_key, 'units': 'metric'}
+            )
+        except UpstreamError as e:
+            return {'success': False, 'error': str(e)}
+        if status == 200:
+            weather = {'success': True, 'temp': data['main']['temp'], 'utc_offset': data.get('timezone')}
+        elif status == 404:
+            weather = {'success': False, 'error': f"Город '{city}' не найден"}
+        else:
+            # Ошибка ключа, лимита или сервиса временная — такой ответ не кэшируется
+            return {'success': False, 'error': f"Сервис погоды недоступен (код {status})"}
+        self._entries[key] = (weather, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.cache_size:
+            self._entries.popitem(last=False)
+        return weather